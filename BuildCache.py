@@ -0,0 +1,77 @@
+import os
+
+class BuildCache:
+    """
+    On-disk manifest of the .jack files of one directory that were analyzed successfully.
+    Each entry maps a file name to the hash of its content and the analyzer version that produced its .xml.
+    """
+
+    manifest_name = '.jackcache.json'
+
+    def __init__(self, directory: str, version: str):
+        self.directory = directory
+        self.version = version
+        self.path = os.path.join(directory, self.manifest_name)
+        self.entries = {}
+        import json
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f).get('files', {})
+        except (OSError, ValueError, AttributeError):
+            pass  # missing or corrupt manifest, everything gets rebuilt
+
+
+    @staticmethod
+    def digest(input_file: str):
+        """
+        Returns the sha256 of the file's content, None if it cannot be read.
+        """
+        try:
+            with open(input_file, 'rb') as f:
+                return BuildCache.digestData(f.read())
+        except OSError:
+            return None
+
+
+    @staticmethod
+    def digestData(data: bytes):
+        """
+        The digest of a file's content already read, the same as digest() of the file.
+        """
+        import hashlib
+        return hashlib.sha256(data).hexdigest()
+
+
+    def isFresh(self, input_file: str, digest: str):
+        """
+        True if the file's output was produced from this exact content by this analyzer version.
+        """
+        entry = self.entries.get(os.path.basename(input_file))
+        return (digest is not None and entry is not None and entry.get('hash') == digest
+                and entry.get('version') == self.version
+                and os.path.exists(os.path.splitext(input_file)[0] + '.xml'))
+
+
+    def record(self, input_file: str, digest: str):
+        self.entries[os.path.basename(input_file)] = {'hash': digest, 'version': self.version}
+
+
+    def forget(self, input_file: str):
+        self.entries.pop(os.path.basename(input_file), None)
+
+
+    def evict(self):
+        """
+        Drops the entries of source files that no longer exist.
+        """
+        for name in list(self.entries):
+            if not os.path.exists(os.path.join(self.directory, name)):
+                del self.entries[name]
+
+
+    def save(self):
+        import json
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'files': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -1,30 +1,244 @@
-from JackTokenizer import JackTokenizer
-import xml.etree.cElementTree as ET
+from __future__ import annotations
+import io
+import os
+from itertools import repeat
+from JackTokenizer import JackTokenizer, TokenTypes, KEYWORD, SYMBOL, INT_CONST, STRING_CONST, IDENTIFIER, UNKNOWN
+from ParseTree import Node, ParseTree, readBinary, writeBinary, writeXml
+from XmlStreamWriter import XmlStreamWriter
+
+TYPE_CHECKING = False  # typing.TYPE_CHECKING without importing typing, type checkers treat it the same
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ET  # annotations only, the engine never needs ElementTree at run time
+
+
+class SyntaxDiagnostic(Exception):
+    """
+    One syntax error, at the offset in the UTF-8 source of the token it was found on.
+    Raised where the error is found, the engine records it and resumes parsing.
+    """
+
+    def __init__(self, message: str, offset: int, line: int, column: int):
+        super().__init__(message, offset, line, column)
+        self.message = message
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: {self.message}"
+
+
+
+class JackSyntaxError(Exception):
+    """
+    Raised by compileClass after the whole class was parsed, with every syntax error found.
+    """
+
+    def __init__(self, diagnostics: list):
+        super().__init__(diagnostics)
+        self.diagnostics = diagnostics
+
+
+    def __str__(self):
+        count = len(self.diagnostics)
+        return f"{count} syntax error{'s' if count > 1 else ''}" + \
+            ''.join(f"\n  {diagnostic}" for diagnostic in self.diagnostics)
+
+
 
 class CompilationEngine:
 
-    def __init__(self, input: str, output: str):
+    Operators = frozenset(['+', '-', '*', '/', '>', '<', '&', '|', '='])
+    UnaryOperators = frozenset(['-', '~'])
+    KeywordConstants = frozenset(['true', 'false', 'null', 'this'])
+    ClassVarKeywords = frozenset(['static', 'field'])
+    SubroutineKeywords = frozenset(['function', 'constructor', 'method'])
+    Types = frozenset(['int', 'char', 'boolean'])  # besides class names
+    ReturnTypes = Types | frozenset(['void'])
+    StatementsEnd = frozenset(['}', None])
+
+    # the first token of a statement, and the method compiling it
+    StatementMethods = {'let': 'compileLet', 'do': 'compileDo', 'while': 'compileWhile',
+                        'if': 'compileIf', 'return': 'compileReturn'}
+
+    # tokens an expression cannot start with, a return statement followed by one has no value
+    LineEnd = frozenset([';', '{', '}', None, 'class', 'var', 'else']) | \
+        ClassVarKeywords | SubroutineKeywords | frozenset(StatementMethods)
+
+    # where _recover resumes parsing after an error besides ; and }, by the construct recovering
+    MemberSync = ClassVarKeywords | SubroutineKeywords
+    StatementSync = frozenset(StatementMethods)
+    VarDecSync = StatementSync | frozenset(['var'])
+
+    # binding power of the binary operators in precedence mode, Jack itself has none
+    Precedence = {'|': 1, '&': 2, '<': 3, '>': 3, '=': 3, '+': 4, '-': 4, '*': 5, '/': 5}
+
+    # the methods that can nest, and the generators standing in for them in iterative mode
+    IterativeMethods = {'compileStatements': '_genStatements', 'compileLet': '_genLet',
+                        'compileIf': '_genIf', 'compileWhile': '_genWhile', 'compileDo': '_genDo',
+                        'compileReturn': '_genReturn',
+                        'compileExpressionList': '_genExpressionList',
+                        'compileExpression': '_genExpression', 'compileTerm': '_genTerm',
+                        '_compileArrayIndex': '_genArrayIndex'}
+
+    def __init__(self, input: str, output, lazy: bool = False, use_mmap: bool = False,
+                 stream: bool = False, profiler=None, precedence: bool = False,
+                 iterative: bool = False, source: str = None, token_cache: bool = False,
+                 binary: bool = False, workers: int = 0, source_map=None):
         """
         Initializes a new compilation engine
-        """
+        output: the path of the XML file, or a binary file object to write it to
+        lazy: tokenize the input on demand instead of up front
+        use_mmap: tokenize the memory-mapped input file
+        stream: write the XML while parsing instead of building the whole tree first
+        profiler: a Profiler recording the time spent per phase and per compile* method
+        precedence: nest binary operations in expressions by operator precedence
+        instead of the flat term (op term)* list of the Jack grammar
+        iterative: parse statements and expressions from an explicit stack instead of recursing,
+        so that nesting depth is not limited by the Python recursion limit
+        source: the source text, read instead of the input file
+        token_cache: reuse the tokens of the input file's .jackt sidecar, see JackTokenizer
+        binary: write the parse tree in the compact binary format of ParseTree.writeBinary
+        instead of XML, which needs the whole tree and cannot be streamed
+        workers: compile the subroutines of the class in a pool of that many processes,
+        for classes with many subroutines. Needs the whole token table, so not lazy.
+        source_map: a path or binary file object to write the source map of the parse tree to,
+        see SourceMap.py. Needs the whole tree and token table, so neither streamed nor lazy.
+        """
+        if binary and stream:
+            raise ValueError("binary output cannot be streamed")
+        if workers > 1 and lazy:
+            raise ValueError("parallel parsing needs all the tokens, it cannot be lazy")
+        if source_map is not None and (stream or lazy):
+            raise ValueError("a source map needs the whole parse tree and all the tokens, "
+                             "it cannot be streamed or lazy")
+        self.binary = binary
+        self.workers = workers
+        self.diagnostics = []  # the syntax errors found by the last compileClass, see _recover
+        self._expressionOperatorsAt = {}  # see _scanExpression
+        self.source_map = source_map
+        self._sourceName = os.path.basename(input) if input else None
+        self._workerOptions = {'precedence': precedence, 'iterative': iterative}
         
-        self.tokenizer = JackTokenizer(input)
-        self.output_file = open(output, 'wb')
+        if precedence:
+            self.compileExpression = self._compilePrecedenceExpression
+            self._genExpression = self._genPrecedenceExpression
+        if iterative:
+            for name, generator in self.IterativeMethods.items():
+                setattr(self, name, self._iterative(getattr(self, generator)))
+
+        if profiler is None:
+            self.tokenizer = JackTokenizer(input, lazy=lazy, use_mmap=use_mmap, source=source,
+                                           token_cache=token_cache)
+        else:
+            with profiler.phase('tokenize'):
+                self.tokenizer = JackTokenizer(input, lazy=lazy, use_mmap=use_mmap, source=source,
+                                               token_cache=token_cache)
+            if not lazy:
+                profiler.count('tokens', len(self.tokenizer.table))
+            profiler.instrument(self)
+
+        # bound after the methods have been replaced by iterative or profiled versions
+        self._statementHandlers = {token: getattr(self, method) for token, method in self.StatementMethods.items()}
+        if iterative:
+            self._statementGenerators = {token: getattr(self, self.IterativeMethods[method])
+                                         for token, method in self.StatementMethods.items()
+                                         if method in self.IterativeMethods}
+        self.output_file = open(output, 'wb') if isinstance(output, str) else output
+        self.writer = XmlStreamWriter(self.output_file) if stream else None
+
+
+    def load(self, source: str, output):
+        """
+        Starts over on another source text, writing its XML to the binary file object output.
+        The tokenizer and the engine's method tables are reused.
+        """
+        self.tokenizer.load(source)
+        self.output_file = output
+        if self.writer is not None:
+            self.writer = XmlStreamWriter(output)
         
 
+    # works for any node type implementing makeelement() and append(), like ET.SubElement
+    def _subNode(self, parent_node: ET.Element, tag: str):
+        node = parent_node.makeelement(tag, {})
+        parent_node.append(node)
+        return node
+
+
     # current_token[0] = token type , current_token[1] = token value
-    def _advance(self, node: ET.Element):
+    def _advance(self, node: ET.Element, expected: str = None, kind: int = None):
+        # expected: the value the token must have, kind: the kind it must have
         current_token = self.tokenizer.advance()
-        if current_token: 
-            ET.SubElement(node, current_token[0]).text = current_token[1]
+        if current_token is None or (expected is not None and current_token[1] != expected) or \
+                current_token[0] is None or (kind is not None and current_token[0] != TokenTypes[kind]):
+            if current_token is not None:
+                self.tokenizer.position -= 1  # left for _recover to sync on
+            if expected is not None:
+                raise self._error(f"expected '{expected}'")
+            raise self._error("expected an identifier" if kind == IDENTIFIER else "expected a token")
+        if type(node) is Node:
+            node.tree.addTerminal(node, current_token[0], current_token[1])
         else:
-            raise Exception("EOF")
+            self._subNode(node, current_token[0]).text = current_token[1]
+
+
+    def _error(self, message: str):
+        # a SyntaxDiagnostic at the token under the cursor, only built once an error is found,
+        # so positions cost nothing on valid input
+        tokenizer = self.tokenizer
+        token = tokenizer.peek()
+        if token is None:
+            offset, found = len(tokenizer.data), "end of file"
+        else:
+            offset, found = tokenizer.table.starts[tokenizer.position], f"'{token}'"
+        line, column = tokenizer.location(offset)
+        offset = tokenizer.byteOffset(offset)
+        if token is not None and tokenizer.peekKind() == UNKNOWN:
+            # the parser stopped at characters no token matches, that is the error to report
+            if token.startswith('"'):
+                return SyntaxDiagnostic("unterminated string", offset, line, column)
+            return SyntaxDiagnostic(f"unexpected character {found}", offset, line, column)
+        return SyntaxDiagnostic(f"{message}, found {found}", offset, line, column)
+
+
+    def _recover(self, error: SyntaxDiagnostic, sync: frozenset = frozenset()):
+        """
+        Panic mode: records the error, then skips tokens up to and including the next ;
+        or up to the next } (left for the enclosing construct) or sync token, passing over whole { } blocks.
+        """
+        if not self.diagnostics or self.diagnostics[-1].offset != error.offset:
+            self.diagnostics.append(error)  # an error reported again by an enclosing construct is kept once
+        tokenizer = self.tokenizer
+        depth = 0
+        while True:
+            token = tokenizer.peek()
+            if token is None or (depth == 0 and (token == '}' or token in sync)):
+                return
+            tokenizer.advance()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    return
+            elif token == ';' and depth == 0:
+                return
 
     
     def _flush(self):
-        tree = ET.ElementTree(self.root)
-        ET.indent(tree, space="\t", level=0)
-        tree.write(self.output_file, short_empty_elements=False)
+        if self.writer is not None:
+            self.writer.finish()
+        else:
+            self.tree.finish()
+            if self.binary:
+                writeBinary(self.tree, self.output_file)
+            else:
+                writeXml(self.tree, self.output_file)
+            if self.source_map is not None:
+                from SourceMap import writeSourceMap
+                writeSourceMap(self.tree, self.tokenizer, self.source_map, self._sourceName)
 
     
     def _doEmptyToken(self, parent_node: ET.Element):
@@ -33,39 +247,80 @@ class CompilationEngine:
         return parent_node
     
 
-    def _compileOneLine(self, parent_node: ET.Element, child_name: str):
-        node = ET.SubElement(parent_node, child_name)
-        while self.tokenizer.peek() != ";":
-            self._advance(node) # line's body
-        self._advance(node) # ;
+    def _compileType(self, node: ET.Element, types: frozenset = Types):
+        # int, char, boolean, a class name, or another of types
+        if self.tokenizer.peek() not in types and self.tokenizer.peekKind() != IDENTIFIER:
+            raise self._error("expected a type")
+        self._advance(node)
+
+
+    def _compileVariables(self, node: ET.Element):
+        # the type varName (, varName)* ; of a class variable or local variable declaration
+        self._compileType(node)
+        self._advance(node, kind=IDENTIFIER)
+        while self.tokenizer.peek() == ',':
+            self._advance(node) # ,
+            self._advance(node, kind=IDENTIFIER)
+        self._advance(node, ';')
 
 
     def _compileArrayIndex(self, parent_node: ET.Element):
-        self._advance(parent_node) # [
+        self._advance(parent_node, '[')
         self.compileExpression(parent_node)
-        self._advance(parent_node) # ]
+        self._advance(parent_node, ']')
 
 
 
     def compileClass(self):
         """
         Compiles a complete class.
-        """
-        self.root = ET.Element("class") 
-        self._advance(self.root)  # class
-        self._advance(self.root)  # class name
-        self._advance(self.root)  # {
-
-        # conmpiles class variables
-        while self.tokenizer.peek() in ['static', 'field']:
-            self.compileClassVarDec(self.root)
-
-        # compiles subroutine 
-        while self.tokenizer.peek() in ['function', 'constructor', 'method']:
-            self.compileSubroutine(self.root)
-              
-        self._advance(self.root)  # } 
+        Returns the root of the parse tree, a ParseTree.Node unless streaming.
+        Syntax errors do not stop the parsing, it resumes after each one (see _recover)
+        and raises a JackSyntaxError with all of them at the end, nothing is flushed then.
+        """
+        self.diagnostics = []
+        self._expressionOperatorsAt = {}
+        if self.writer is not None:
+            self.root = self.writer.root("class")
+        else:
+            self.tree = ParseTree()
+            self.root = self.tree.root("class")
+        try:
+            self._advance(self.root, 'class')
+            self._advance(self.root, kind=IDENTIFIER)  # class name
+            self._advance(self.root, '{')
+
+            peek = self.tokenizer.peek
+            while True:
+                # conmpiles class variables
+                while peek() in self.ClassVarKeywords:
+                    try:
+                        self.compileClassVarDec(self.root)
+                    except SyntaxDiagnostic as error:
+                        self._recover(error, self.MemberSync)
+
+                # compiles subroutine 
+                if self.workers > 1 and not self.diagnostics:
+                    self._compileSubroutinesInParallel(self.root)
+                while peek() in self.SubroutineKeywords:
+                    try:
+                        self.compileSubroutine(self.root)
+                    except SyntaxDiagnostic as error:
+                        self._recover(error, self.MemberSync)
+
+                if peek() in self.StatementsEnd:
+                    break
+                self._recover(self._error("expected a class variable or subroutine declaration"), self.MemberSync)
+
+            self._advance(self.root, '}')
+            if self.tokenizer.hasMoreTokens():
+                raise self._error("expected end of file")
+        except SyntaxDiagnostic as error:
+            self._recover(error)
+        if self.diagnostics:
+            raise JackSyntaxError(self.diagnostics)
         self._flush() # writes everything to a file
+        return self.root
 
         
 
@@ -73,7 +328,9 @@ class CompilationEngine:
         """
         Compiles static variable declaration or a field declaration.
         """
-        self._compileOneLine(parent_node, 'classVarDec')
+        node = self._subNode(parent_node, 'classVarDec')
+        self._advance(node) # static or field
+        self._compileVariables(node)
 
 
 
@@ -81,32 +338,101 @@ class CompilationEngine:
         """
         Compiles a complete method, function, or constructor.
         """
-        node = ET.SubElement(parent_node, "subroutineDec")
+        node = self._subNode(parent_node, "subroutineDec")
         self._advance(node) # method function or constructor
-        self._advance(node) # subroutine type
-        self._advance(node) # subroutine name
-        self._advance(node) # (
+        self._compileType(node, self.ReturnTypes) # subroutine type
+        self._advance(node, kind=IDENTIFIER) # subroutine name
+        self._advance(node, '(')
 
         self.compileParameterList(node)
 
-        self._advance(node) # )
+        self._advance(node, ')')
 
         self.compileSubroutineBody(node)
 
 
 
+    def _subroutineBoundaries(self):
+        # the token indices where the subroutines from the cursor on start, followed by the end of the last one,
+        # found by matching the braces of their bodies. None if a body is not closed.
+        tokenizer = self.tokenizer
+        kinds, values = tokenizer._kinds, tokenizer._tokens
+        count = len(values)
+        index = tokenizer.position
+        boundaries = []
+        while index < count and values[index] in self.SubroutineKeywords and kinds[index] == KEYWORD:
+            boundaries.append(index)
+            depth = 0
+            while index < count:
+                value = values[index]
+                index += 1
+                if value == '{':
+                    depth += 1
+                elif value == '}':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            else:
+                return None
+        boundaries.append(index)
+        return boundaries
+
+
+
+    def _compileSubroutinesInParallel(self, parent_node: ET.Element):
+        # the subroutines are split into contiguous chunks, which the workers tokenize and compile again.
+        # Unless every chunk compiles to exactly its subroutines, nothing is added and
+        # the sequential loop of compileClass compiles them, raising the same errors.
+        boundaries = self._subroutineBoundaries()
+        if boundaries is None or len(boundaries) < 3:
+            return
+        subroutines = len(boundaries) - 1
+        chunks = min(subroutines, self.workers * 4)
+        tokenizer = self.tokenizer
+        starts, ends, data = tokenizer.table.starts, tokenizer.table.ends, tokenizer.data
+        sources, offsets = [], []
+        for chunk in range(chunks):
+            first, last = subroutines * chunk // chunks, subroutines * (chunk + 1) // chunks
+            source = data[starts[boundaries[first]]:ends[boundaries[last] - 1]]
+            sources.append(source if isinstance(source, str) else source.decode())
+            offsets.append([boundary - boundaries[first] for boundary in boundaries[first:last + 1]])
+
+        from concurrent.futures import ProcessPoolExecutor  # slow to import, only this mode needs it
+        with ProcessPoolExecutor(max_workers=min(self.workers, chunks)) as executor:
+            results = list(executor.map(_compileSubroutines, sources, offsets, repeat(self._workerOptions)))
+        if None in results:
+            return
+        for result in results:
+            tree = readBinary(result)
+            for child in tree.children(0):
+                self._graft(parent_node, tree, child)
+        tokenizer.position = boundaries[-1]
+
+
+
+    def _graft(self, parent_node: ET.Element, tree: ParseTree, index: int):
+        if type(parent_node) is Node:
+            parent_node.tree.graft(parent_node, tree, index)
+        else:
+            self._copySubtree(parent_node, tree, index)
+
+
+
     def compileParameterList(self, parent_node: ET.Element):
         """
         Compiles (possibly empty) parameter list.
         Does not handle the enclosing parentheses tokens ( ).
         """
-        node = ET.SubElement(parent_node, "parameterList")
+        node = self._subNode(parent_node, "parameterList")
         if self.tokenizer.peek() == ')':
             self._doEmptyToken(node)
         else:
-            while self.tokenizer.peek() in ['char', 'int', 'boolean']:
-                while self.tokenizer.peek() != ')':
-                    self._advance(node)
+            self._compileType(node)
+            self._advance(node, kind=IDENTIFIER)
+            while self.tokenizer.peek() == ',':
+                self._advance(node) # ,
+                self._compileType(node)
+                self._advance(node, kind=IDENTIFIER)
         
 
 
@@ -114,11 +440,11 @@ class CompilationEngine:
         """
         Compiles a subroutine's body.
         """
-        node = ET.SubElement(parent_node, "subroutineBody")
-        self._advance(node) # {
+        node = self._subNode(parent_node, "subroutineBody")
+        self._advance(node, '{')
         self.compileVarDec(node)
         self.compileStatements(node)
-        self._advance(node) # }
+        self._advance(node, '}')
 
 
 
@@ -126,14 +452,16 @@ class CompilationEngine:
         """
         Compiles a variable declaration.
         """
-        node = ET.SubElement(parent_node, "varDec")
+        node = self._subNode(parent_node, "varDec")
         if self.tokenizer.peek() != 'var':
             self._doEmptyToken(node)
         else:
             while self.tokenizer.peek() == 'var':
-                while self.tokenizer.peek() != ';':     
-                    self._advance(node)
-                self._advance(node) # ;
+                try:
+                    self._advance(node) # var
+                    self._compileVariables(node)
+                except SyntaxDiagnostic as error:
+                    self._recover(error, self.VarDecSync)
 
         
 
@@ -142,27 +470,22 @@ class CompilationEngine:
         Compiles a sequence of statements.
         Does not handle the enclosing curly bracket tokens { }.
         """
-        node = ET.SubElement(parent_node, "statements")
-
-        while self.tokenizer.peek() != '}':
-            
-            if self.tokenizer.peek() == 'let':
-                self.compileLet(node)
-
-            elif self.tokenizer.peek() == 'do':
-                 self.compileDo(node)
-
-            elif self.tokenizer.peek() == 'while':
-                self.compileWhile(node)
-
-            elif self.tokenizer.peek() == 'if':
-                self.compileIf(node)
-                
-            elif self.tokenizer.peek() == 'return':
-                self.compileReturn(node)
-            
+        node = self._subNode(parent_node, "statements")
+
+        # stops at the closing }, a statement that fails is skipped by _recover
+        handlers = self._statementHandlers
+        peek = self.tokenizer.peek
+        while True:
+            handler = handlers.get(peek())
+            if handler is not None:
+                try:
+                    handler(node)
+                except SyntaxDiagnostic as error:
+                    self._recover(error, self.StatementSync)
+            elif peek() in self.StatementsEnd:
+                return
             else:
-                break
+                self._recover(self._error("expected a statement"), self.StatementSync)
 
 
 
@@ -170,11 +493,14 @@ class CompilationEngine:
         """
         Compiles a let statement.
         """
-        node = ET.SubElement(parent_node, "letStatement")
+        node = self._subNode(parent_node, "letStatement")
         self._advance(node) # let
-        self._advance(node) # identifier
-        self._advance(node) # =
-        self.compileExpressionList(node)
+        self._advance(node, kind=IDENTIFIER)
+        if self.tokenizer.peek() == '[':
+            self._compileArrayIndex(node)
+        self._advance(node, '=')
+        self.compileExpression(node)
+        self._advance(node, ';')
         
 
 
@@ -182,20 +508,20 @@ class CompilationEngine:
         """
         Compiles an if statement, possibly with a trailing else clause.
         """
-        node = ET.SubElement(parent_node, "ifStatement")
+        node = self._subNode(parent_node, "ifStatement")
         self._advance(node) #  if
-        self._advance(node) #  (
+        self._advance(node, '(')
         self.compileExpression(node)
-        self._advance(node) #  )
-        self._advance(node) #  {
+        self._advance(node, ')')
+        self._advance(node, '{')
         self.compileStatements(node)
-        self._advance(node) # }
+        self._advance(node, '}')
 
         if self.tokenizer.peek() == 'else':
             self._advance(node) # else
-            self._advance(node) #  {
+            self._advance(node, '{')
             self.compileStatements(node)
-            self._advance(node) # }
+            self._advance(node, '}')
 
 
 
@@ -203,27 +529,37 @@ class CompilationEngine:
         """
         Compiles a while statement.
         """
-        node = ET.SubElement(parent_node, "whileStatement")
+        node = self._subNode(parent_node, "whileStatement")
         self._advance(node) # while
-        self._advance(node) # (
+        self._advance(node, '(')
         self.compileExpression(node)
-        self._advance(node) # )
-        self._advance(node) # {
+        self._advance(node, ')')
+        self._advance(node, '{')
         self.compileStatements(node)
-        self._advance(node) # }
+        self._advance(node, '}')
         
 
 
+    def _compileCallName(self, node: ET.Element):
+        # do, then subroutineName or (className | varName) . subroutineName
+        self._advance(node) # do
+        self._advance(node, kind=IDENTIFIER)
+        if self.tokenizer.peek() == '.':
+            self._advance(node) # .
+            self._advance(node, kind=IDENTIFIER)
+
+
+
     def compileDo(self, parent_node: ET.Element):
         """
         Compiles a do statement.
         """
-        node = ET.SubElement(parent_node, "doStatement")
-        while self.tokenizer.peek() != '(':
-            self._advance(node) # do someSubroutine
-        self._advance(node) # (
+        node = self._subNode(parent_node, "doStatement")
+        self._compileCallName(node)
+        self._advance(node, '(')
         self.compileExpressionList(node)
-        self._advance(node) # )
+        self._advance(node, ')')
+        self._advance(node, ';')
         
 
 
@@ -231,7 +567,11 @@ class CompilationEngine:
         """
         Compiles a return statement.
         """
-        self._compileOneLine(parent_node, "return")
+        node = self._subNode(parent_node, "return")
+        self._advance(node) # return
+        if self.tokenizer.peek() not in self.LineEnd:
+            self.compileExpression(node)
+        self._advance(node, ';')
 
     
 
@@ -240,14 +580,14 @@ class CompilationEngine:
         Compiles a (possibly empty) comma-separated list of expressions.
         Returns the number of expressions in the list.
         """
-        node = ET.SubElement(parent_node, "expressionList")
+        node = self._subNode(parent_node, "expressionList")
         if self.tokenizer.peek() == ')':
             self._doEmptyToken(node)
         else:
-            while self.tokenizer.peek() != ')':
+            self.compileExpression(node)
+            while self.tokenizer.peek() == ',':
+                self._advance(node) # ,
                 self.compileExpression(node)
-                if self.tokenizer.peek() == ',':
-                    self._advance(node) # ,
                 
 
 
@@ -255,13 +595,149 @@ class CompilationEngine:
         """
         Compiles an expression.
         """
-        node = ET.SubElement(parent_node, "expression")
+        node = self._subNode(parent_node, "expression")
         self.compileTerm(node)
-        while self.tokenizer.peek() in ['+', '-', '*', '/', '>', '<', '&', '|', '=']:
+        while self.tokenizer.peek() in self.Operators:
             self._advance(node)
             self.compileTerm(node)
 
 
+
+    def _compilePrecedenceExpression(self, parent_node: ET.Element):
+        """
+        Compiles an expression into a tree of binary operations by precedence climbing,
+        operators of equal precedence associate to the left:
+        a + b * c - d gives expression(expression(a + expression(b * c)) - d).
+        The terms are compiled straight into the nodes nesting them, see _expressionShape.
+        """
+        node = self._subNode(parent_node, "expression")
+        opens, closes = self._expressionShape()
+        last = len(opens) - 1
+        parents = [node]
+        for term in range(last + 1):
+            for _ in range(opens[term]):
+                parents.append(self._subNode(parents[-1], "expression"))
+            self.compileTerm(parents[-1])
+            if closes[term]:
+                del parents[-closes[term]:]
+            if term < last:
+                if self.tokenizer.peek() not in self.Operators:
+                    raise self._error("expected an operator")
+                self._advance(parents[-1])
+
+
+
+    def _expressionShape(self):
+        # opens[i] and closes[i]: how many of the expression nodes nested in the expression
+        # at the cursor start before its term i and end after it
+        precedences = self._expressionOperators()
+        count = len(precedences)
+        opens, closes = [0] * (count + 1), [0] * (count + 1)
+        if count < 2:
+            return opens, closes
+        position = 0  # the next operator, it follows the term of the same index
+
+        def climb(min_precedence: int):
+            # recurses once per precedence level at most, every operator taken wraps
+            # the operation so far, from the first term on, in an expression node
+            nonlocal position
+            first = position
+            while position < count and precedences[position] >= min_precedence:
+                precedence = precedences[position]
+                position += 1
+                climb(precedence + 1)
+                opens[first] += 1
+                closes[position] += 1
+
+        climb(0)
+        opens[0] -= 1  # the outermost operation is the expression node itself
+        closes[count] -= 1
+        return opens, closes
+
+
+
+    def _expressionOperators(self):
+        # the precedences of the binary operators of the expression at the cursor, in order
+        tokenizer = self.tokenizer
+        if tokenizer.peek() is None:
+            return []
+        offset = tokenizer.table.starts[tokenizer.position]
+        precedences = self._expressionOperatorsAt.pop(offset, None)
+        if precedences is None:
+            self._scanExpression()
+            precedences = self._expressionOperatorsAt.pop(offset, [])
+        return precedences
+
+
+
+    def _scanExpression(self):
+        # finds the operators of the expression at the cursor and of the expressions nested in it,
+        # in one pass over their tokens, by the source offsets of the expressions. The nested ones
+        # are looked up when they are compiled, so every token is scanned once however deep they nest.
+        # Stops at the first token that cannot continue the expression, the parse reports it.
+        tokenizer = self.tokenizer
+        peek, peekKind, precedence = tokenizer.peek, tokenizer.peekKind, self.Precedence
+        found = {}
+        frames = []  # (first token, operators) of the enclosing expressions
+        first, operators = 0, []
+        index = 0
+        operand = True  # a term is expected next
+        while True:
+            token = peek(index)
+            if operand:
+                if token in self.UnaryOperators:
+                    pass
+                elif token == '(':
+                    frames.append((first, operators))
+                    first, operators = index + 1, []
+                else:
+                    kind = peekKind(index)
+                    if not (kind == IDENTIFIER or kind == INT_CONST or kind == STRING_CONST or
+                            (kind == KEYWORD and token in self.KeywordConstants)):
+                        break
+                    operand = False
+            elif token in precedence:
+                operators.append(precedence[token])
+                operand = True
+            elif token == '.':
+                index += 1  # the subroutine name
+            elif token == '(' and peek(index + 1) == ')':
+                index += 1  # no arguments
+            elif token == '(' or token == '[':
+                frames.append((first, operators))
+                first, operators = index + 1, []
+                operand = True
+            elif token == ',' and frames:
+                found[first] = operators
+                first, operators = index + 1, []
+                operand = True
+            elif (token == ')' or token == ']') and frames:
+                found[first] = operators
+                first, operators = frames.pop()
+            else:
+                break
+            index += 1
+
+        frames.append((first, operators))
+        starts, position = tokenizer.table.starts, tokenizer.position
+        count = len(tokenizer.table) - position
+        self._expressionOperatorsAt = {starts[position + first]: operators
+                                       for first, operators in list(found.items()) + frames if first < count}
+
+
+
+    def _copySubtree(self, parent_node: ET.Element, tree: ParseTree, index: int):
+        # copies node index of the finished tree and its subtree under parent_node
+        ends, kinds, tags, texts = tree.ends, tree.kinds, tree.tags, tree.texts
+        parents = [(ends[index], parent_node)]
+        for child in range(index, ends[index]):
+            while parents[-1][0] <= child:
+                parents.pop()
+            node = self._subNode(parents[-1][1], tags[kinds[child]])
+            node.text = texts[child]
+            parents.append((ends[child], node))
+
+
             
     def compileTerm(self, parent_node: ET.Element):
         """
@@ -269,47 +745,266 @@ class CompilationEngine:
         - A variable, array element, or subroutine call.
         - Handles symbols like [ ], ( ), or .
         """
-        node = ET.SubElement(parent_node, "term")
+        node = self._subNode(parent_node, "term")
 
         current_token = self.tokenizer.peek()
-        current_token_type, _ = self.tokenizer.tokenTypeAndValue(current_token)
-
-        next_token = self.tokenizer.peek(index=1)
-
-        if current_token == '(':
-            self._advance(node) # (
-            self.compileExpression(node) # expression
-            self._advance(node) # )
+        kind = self.tokenizer.peekKind()
 
-        elif (current_token_type in ['integerConstant', 'stringConstant'] or 
-              current_token in ['true', 'false', 'null', 'this']):
-            self._advance(node) 
-        
-        elif current_token in ['-', '~']:
-            self._advance(node) # - or ~ 
-            self.compileTerm(node)
-        
-        elif current_token_type == 'identifier':
+        if kind == IDENTIFIER:
+            next_token = self.tokenizer.peek(index=1)
             if next_token == '(':
                 self._advance(node) # subroutine
                 self._advance(node) # (
                 self.compileExpressionList(node)
-                self._advance(node) # )
+                self._advance(node, ')')
             elif next_token == '.': 
                 self._advance(node) # class
                 self._advance(node) # .
-                self._advance(node) # subroutine
-                self._advance(node) # (
+                self._advance(node, kind=IDENTIFIER) # subroutine
+                self._advance(node, '(')
                 self.compileExpressionList(node)
-                self._advance(node) # )
+                self._advance(node, ')')
             elif next_token == '[':
                 self._advance(node)
                 self._compileArrayIndex(node)
             else:
                 self._advance(node)
-            
 
+        elif kind == INT_CONST or kind == STRING_CONST:
+            self._advance(node)
 
-    
-         
+        elif kind == SYMBOL:
+            if current_token == '(':
+                self._advance(node) # (
+                self.compileExpression(node) # expression
+                self._advance(node, ')')
+            elif current_token in self.UnaryOperators:
+                self._advance(node) # - or ~ 
+                self.compileTerm(node)
+            else:
+                raise self._error("expected a term")
+
+        elif kind == KEYWORD and current_token in self.KeywordConstants:
+            self._advance(node)
+
+        else:
+            raise self._error("expected a term")
+
+
+
+    # Iterative mode: every _gen* generator mirrors the compile method of the same name,
+    # but yields the generator of a nested construct instead of calling its compile method.
+
+    def _iterative(self, generator):
+        def compile(parent_node: ET.Element):
+            self._run(generator(parent_node))
+        return compile
+
+
+    def _run(self, generator):
+        # drives the generators from an explicit stack, exceptions propagate to the enclosing generators
+        stack = [generator]
+        error = None
+        while stack:
+            try:
+                if error is None:
+                    nested = next(stack[-1])
+                else:
+                    # cleared first, the generator may handle the error and finish right away
+                    error, thrown = None, error
+                    nested = stack[-1].throw(thrown)
+            except StopIteration:
+                stack.pop()
+                continue
+            except Exception as exception:
+                stack.pop()
+                if not stack:
+                    raise
+                error = exception
+                continue
+            stack.append(nested)
+
+
+    def _genArrayIndex(self, parent_node: ET.Element):
+        self._advance(parent_node, '[')
+        yield self._genExpression(parent_node)
+        self._advance(parent_node, ']')
+
+
+    def _genStatements(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "statements")
+        generators = self._statementGenerators
+        peek = self.tokenizer.peek
+        while True:
+            token = peek()
+            generator = generators.get(token)
+            try:
+                if generator is not None:
+                    yield generator(node)
+                elif token in self.StatementsEnd:
+                    return
+                else:
+                    raise self._error("expected a statement")
+            except SyntaxDiagnostic as error:
+                self._recover(error, self.StatementSync)
+
+
+    def _genLet(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "letStatement")
+        self._advance(node) # let
+        self._advance(node, kind=IDENTIFIER)
+        if self.tokenizer.peek() == '[':
+            yield self._genArrayIndex(node)
+        self._advance(node, '=')
+        yield self._genExpression(node)
+        self._advance(node, ';')
+
+
+    def _genIf(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "ifStatement")
+        self._advance(node) # if
+        self._advance(node, '(')
+        yield self._genExpression(node)
+        self._advance(node, ')')
+        self._advance(node, '{')
+        yield self._genStatements(node)
+        self._advance(node, '}')
 
+        if self.tokenizer.peek() == 'else':
+            self._advance(node) # else
+            self._advance(node, '{')
+            yield self._genStatements(node)
+            self._advance(node, '}')
+
+
+    def _genWhile(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "whileStatement")
+        self._advance(node) # while
+        self._advance(node, '(')
+        yield self._genExpression(node)
+        self._advance(node, ')')
+        self._advance(node, '{')
+        yield self._genStatements(node)
+        self._advance(node, '}')
+
+
+    def _genDo(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "doStatement")
+        self._compileCallName(node)
+        self._advance(node, '(')
+        yield self._genExpressionList(node)
+        self._advance(node, ')')
+        self._advance(node, ';')
+
+
+    def _genReturn(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "return")
+        self._advance(node) # return
+        if self.tokenizer.peek() not in self.LineEnd:
+            yield self._genExpression(node)
+        self._advance(node, ';')
+
+
+    def _genExpressionList(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "expressionList")
+        if self.tokenizer.peek() == ')':
+            self._doEmptyToken(node)
+        else:
+            yield self._genExpression(node)
+            while self.tokenizer.peek() == ',':
+                self._advance(node) # ,
+                yield self._genExpression(node)
+
+
+    def _genExpression(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "expression")
+        yield self._genTerm(node)
+        while self.tokenizer.peek() in self.Operators:
+            self._advance(node)
+            yield self._genTerm(node)
+
+
+    def _genPrecedenceExpression(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "expression")
+        opens, closes = self._expressionShape()
+        last = len(opens) - 1
+        parents = [node]
+        for term in range(last + 1):
+            for _ in range(opens[term]):
+                parents.append(self._subNode(parents[-1], "expression"))
+            yield self._genTerm(parents[-1])
+            if closes[term]:
+                del parents[-closes[term]:]
+            if term < last:
+                if self.tokenizer.peek() not in self.Operators:
+                    raise self._error("expected an operator")
+                self._advance(parents[-1])
+
+
+    def _genTerm(self, parent_node: ET.Element):
+        node = self._subNode(parent_node, "term")
+
+        current_token = self.tokenizer.peek()
+        kind = self.tokenizer.peekKind()
+
+        if kind == IDENTIFIER:
+            next_token = self.tokenizer.peek(index=1)
+            if next_token == '(':
+                self._advance(node) # subroutine
+                self._advance(node) # (
+                yield self._genExpressionList(node)
+                self._advance(node, ')')
+            elif next_token == '.':
+                self._advance(node) # class
+                self._advance(node) # .
+                self._advance(node, kind=IDENTIFIER) # subroutine
+                self._advance(node, '(')
+                yield self._genExpressionList(node)
+                self._advance(node, ')')
+            elif next_token == '[':
+                self._advance(node)
+                yield self._genArrayIndex(node)
+            else:
+                self._advance(node)
+
+        elif kind == INT_CONST or kind == STRING_CONST:
+            self._advance(node)
+
+        elif kind == SYMBOL:
+            if current_token == '(':
+                self._advance(node) # (
+                yield self._genExpression(node) # expression
+                self._advance(node, ')')
+            elif current_token in self.UnaryOperators:
+                self._advance(node) # - or ~
+                yield self._genTerm(node)
+            else:
+                raise self._error("expected a term")
+
+        elif kind == KEYWORD and current_token in self.KeywordConstants:
+            self._advance(node)
+
+        else:
+            raise self._error("expected a term")
+
+
+
+def _compileSubroutines(source: str, boundaries: list, options: dict):
+    # runs in a worker process: compiles the subroutines of source under a placeholder root,
+    # returns the tree in the binary format, or None unless the subroutines end at the token boundaries
+    engine = CompilationEngine(None, io.BytesIO(), source=source, **options)
+    tree = ParseTree()
+    root = tree.root("class")
+    try:
+        for end in boundaries[1:]:
+            engine.compileSubroutine(root)
+            if engine.tokenizer.position != end:
+                return None
+    except Exception:
+        return None
+    if engine.diagnostics or engine.tokenizer.hasMoreTokens():
+        return None
+    tree.finish()
+    output = io.BytesIO()
+    writeBinary(tree, output)
+    return output.getvalue()
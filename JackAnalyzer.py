@@ -1,25 +1,424 @@
+import functools
+import io
+import os
 import sys
+import time
+from BuildCache import BuildCache
 from JackTokenizer import JackTokenizer
 from CompilationEngine import CompilationEngine
 
+# argparse, json, zipfile, concurrent.futures, threading and the Profiler are imported by the
+# code that needs them, they would add tens of milliseconds to every start otherwise,
+# see benchmarks/bench_startup.py
+
+# bump whenever a change alters the produced XML, it invalidates the build caches
+VERSION = "1.3"
+
+
+def outputPath(input_file: str, suffix: str):
+    """
+    The path of the output of input_file with the given suffix, such as '.xml'.
+    Raises ValueError unless input_file is a .jack file, whose output would overwrite it otherwise.
+    """
+    root, extension = os.path.splitext(input_file)
+    if extension != '.jack':
+        raise ValueError(f"not a .jack file: {input_file}")
+    return root + suffix
+
+
+
 class JackAnalyzer:
-    
-    def __init__(self, input_file):
+
+    def __init__(self, input_file, profile: bool = False, profile_memory: bool = False,
+                 token_cache: bool = False, binary: bool = False, subroutine_workers: int = 0,
+                 source_map: bool = False):
+        """
+        profile: write a JSON report of the time spent per phase and per compile* method
+        next to the output, profile_memory: add the tracemalloc peak per phase to it
+        token_cache: load and save the tokens in a .jackt sidecar next to the input
+        binary: write the parse tree to a .jtree file in the compact binary format instead of XML
+        subroutine_workers: compile the subroutines of the file in a pool of that many processes
+        source_map: also write a source map of the output next to it, see SourceMap.py
+        """
         self.input_file = input_file
-        self.output_file = input_file.replace('.jack', '.xml')
+        self.binary = binary
+        self.output_file = outputPath(input_file, '.jtree' if binary else '.xml')
+        self.profiler = None
+        if profile or profile_memory:
+            from Profiler import Profiler
+            self.profiler = Profiler(memory=profile_memory)
+        self.token_cache = token_cache
+        self.subroutine_workers = subroutine_workers
+        self.source_map = None
+        if source_map:
+            from SourceMap import SUFFIX
+            self.source_map = self.output_file + SUFFIX
+
 
-    
     def run(self):
-        compileEngine = CompilationEngine(self.input_file, self.output_file)
-        compileEngine.compileClass()
-            
+        # written next to the output and moved over it once the class compiled,
+        # a syntax error keeps the previous output instead of truncating it
+        partial_file = self.output_file + '.tmp'
+        compileEngine = CompilationEngine(self.input_file, partial_file,
+                                          stream=not (self.binary or self.source_map),
+                                          profiler=self.profiler, token_cache=self.token_cache,
+                                          binary=self.binary, workers=self.subroutine_workers,
+                                          source_map=self.source_map)
+        try:
+            compileEngine.compileClass()
+        except BaseException:
+            compileEngine.output_file.close()
+            os.remove(partial_file)
+            raise
+        else:
+            compileEngine.output_file.close()
+            os.replace(partial_file, self.output_file)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
 
+        if self.profiler is not None:
+            import json
+            with open(outputPath(self.input_file, '.profile.json'), 'w') as f:
+                json.dump(self.profiler.report(self.input_file), f, indent=1)
 
-if __name__ == "__main__":
 
-    input = sys.argv[1]
-    main = JackAnalyzer(input)
-    main.run()
-    
-    
-    
\ No newline at end of file
+
+def collectInputs(paths: list):
+    """
+    Expands directories to the .jack files they contain, sorted by name.
+    Files are kept in the order they were given, whatever their extension:
+    the analysis reports the ones that are not .jack files instead of overwriting them.
+    """
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            inputs.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                          if name.endswith('.jack'))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def analyzeFile(input_file: str, **options):
+    """
+    Analyzes one file, returns None on success or the error message.
+    options are passed on to JackAnalyzer.
+    """
+    try:
+        JackAnalyzer(input_file, **options).run()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _analyzeFiles(inputs: list, workers: int = None, options: dict = None):
+    options = options or {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(inputs))
+    if workers <= 1:
+        return [analyzeFile(input_file, **options) for input_file in inputs]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(functools.partial(analyzeFile, **options), inputs,
+                                 chunksize=max(1, len(inputs) // (workers * 4))))
+
+
+def _readSource(input_file: str):
+    # the raw bytes, so that the build cache digest needs no second read, see _decodeSource
+    with open(input_file, "rb") as f:
+        return f.read()
+
+
+def _decodeSource(data: bytes):
+    # decodes and translates newlines the way open(input_file, "r") does
+    return io.TextIOWrapper(io.BytesIO(data)).read()
+
+
+def _writeXml(output_file: str, xml: bytes):
+    with open(output_file, "wb") as f:
+        f.write(xml)
+
+
+def _analyzePipelined(inputs: list, caches: dict = None, digests: dict = None, readers: int = 4,
+                      parsers: int = 1, writers: int = 4, queue_size: int = 16):
+    # three stages of threads: reading the sources, parsing them and writing the XML.
+    # Bounded queues between the stages keep the readers at most queue_size files ahead.
+    # With caches ({directory: BuildCache}), the readers hash the bytes they read and pass over
+    # the fresh files, the digests of the others go to digests: a file is only read once.
+    import queue
+    import threading
+    errors = [None] * len(inputs)
+    pending = iter(enumerate(inputs))
+    pending_lock = threading.Lock()
+    sources = queue.Queue(queue_size)
+    outputs = queue.Queue(queue_size)
+
+    def read():
+        while True:
+            with pending_lock:
+                index, input_file = next(pending, (None, None))
+            if index is None:
+                return
+            try:
+                outputPath(input_file, '.xml')  # checked before anything is read
+                data = _readSource(input_file)
+            except Exception as e:
+                errors[index] = f"{type(e).__name__}: {e}"
+                data = None
+            if caches is not None:
+                digest = BuildCache.digestData(data) if data is not None else None
+                if digest is not None and caches[os.path.dirname(input_file) or '.'].isFresh(input_file, digest):
+                    continue
+                digests[input_file] = digest
+            if data is not None:
+                try:
+                    sources.put((index, _decodeSource(data)))
+                except Exception as e:
+                    errors[index] = f"{type(e).__name__}: {e}"
+
+    def parse():
+        buffer = io.BytesIO()
+        engine = CompilationEngine(None, buffer, stream=True)
+        for index, source in iter(sources.get, None):
+            try:
+                engine.load(source, buffer)
+                engine.compileClass()
+                outputs.put((index, buffer.getvalue()))
+            except Exception as e:
+                errors[index] = f"{type(e).__name__}: {e}"
+            buffer.seek(0)
+            buffer.truncate()
+
+    def write():
+        for index, xml in iter(outputs.get, None):
+            try:
+                _writeXml(outputPath(inputs[index], '.xml'), xml)
+            except Exception as e:
+                errors[index] = f"{type(e).__name__}: {e}"
+
+    # all the stages run at once, a stage's threads are sent one None each once the stage before it is done
+    stages = [(read, readers, None), (parse, parsers, sources), (write, writers, outputs)]
+    threads = [[threading.Thread(target=target, daemon=True) for _ in range(max(1, count))]
+               for target, count, _ in stages]
+    for stage in threads:
+        for thread in stage:
+            thread.start()
+    for stage, (_, _, consumed) in zip(threads, stages):
+        if consumed is not None:
+            for _ in stage:
+                consumed.put(None)
+        for thread in stage:
+            thread.join()
+    return errors
+
+
+def analyzeAll(inputs: list, workers: int = None, use_cache: bool = False, pipeline: bool = False,
+               **options):
+    """
+    Analyzes the files in a process pool.
+    use_cache: skip files whose content and analyzer version match the
+    build cache of their directory, then update the caches.
+    pipeline: analyze the files in this process instead, reading and writing them
+    in thread pools while the parsing goes on, which hides the latency of slow storage.
+    workers and options are not used then.
+    options are passed on to JackAnalyzer.
+    Returns (input file, error or None) pairs in input order.
+    """
+    if not use_cache:
+        if pipeline:
+            return list(zip(inputs, _analyzePipelined(inputs)))
+        return list(zip(inputs, _analyzeFiles(inputs, workers, options)))
+
+    caches, digests = {}, {}
+    for input_file in dict.fromkeys(inputs):
+        directory = os.path.dirname(input_file) or '.'
+        if directory not in caches:
+            caches[directory] = BuildCache(directory, VERSION)
+
+    if pipeline:
+        # the readers hash the files, a serial pass reading them first would defeat the pipeline
+        unique = list(dict.fromkeys(inputs))
+        errors = dict(zip(unique, _analyzePipelined(unique, caches, digests)))
+        stale = [input_file for input_file in unique if input_file in digests]
+    else:
+        stale = []
+        for input_file in dict.fromkeys(inputs):
+            digests[input_file] = BuildCache.digest(input_file)
+            if not caches[os.path.dirname(input_file) or '.'].isFresh(input_file, digests[input_file]):
+                stale.append(input_file)
+        errors = dict(zip(stale, _analyzeFiles(stale, workers, options)))
+
+    for input_file in stale:
+        cache = caches[os.path.dirname(input_file) or '.']
+        if errors[input_file] is None and digests[input_file] is not None:
+            cache.record(input_file, digests[input_file])
+        else:
+            cache.forget(input_file)
+    for cache in caches.values():
+        cache.evict()
+        cache.save()
+
+    return [(input_file, errors.get(input_file)) for input_file in inputs]
+
+
+def analyzeMany(sources, archive=None, errors=None, **options):
+    """
+    Analyzes Jack sources held in memory, without temporary files.
+    sources: an iterable of (name, source text) pairs
+    archive: a path or binary file object, the XML of every source is also written
+    to this zip archive as name with .jack replaced by .xml (.jtree if binary), in a single file
+    errors: called as errors(name, exception) for each source that fails, which is then
+    skipped and the analysis goes on with the next one. Without it the first failing
+    source raises its exception and ends the iteration.
+    options are passed on to CompilationEngine, streaming by default unless binary.
+    Yields (name, XML bytes) pairs as the sources are analyzed.
+    """
+    import contextlib
+    import zipfile
+    options.setdefault('stream', not options.get('binary'))
+    suffix = '.jtree' if options.get('binary') else '.xml'
+    buffer = io.BytesIO()
+    engine = CompilationEngine(None, buffer, **options)
+    with zipfile.ZipFile(archive, 'w') if archive is not None else contextlib.nullcontext() as bundle:
+        for name, source in sources:
+            try:
+                engine.load(source, buffer)  # starts a fresh writer or tree
+                engine.compileClass()
+                xml = buffer.getvalue()
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors(name, e)
+                continue
+            finally:
+                buffer.seek(0)
+                buffer.truncate()
+            if bundle is not None:
+                bundle.writestr(os.path.splitext(name)[0] + suffix, xml)
+            yield name, xml
+
+
+def snapshot(paths: list):
+    """
+    Returns {input file: (mtime in ns, size)} for the .jack files under paths.
+    """
+    stats = {}
+    for input_file in collectInputs(paths):
+        try:
+            stat = os.stat(input_file)
+        except OSError:
+            continue
+        stats[input_file] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+class Watcher:
+    """
+    Reanalyzes the .jack files under paths in this process as they are added or modified.
+    Changes are detected by polling os.stat, which needs no extra dependencies.
+    options are passed on to JackAnalyzer.
+    """
+
+    def __init__(self, paths: list, use_cache: bool = True, out=sys.stdout, **options):
+        self.paths = paths
+        self.use_cache = use_cache
+        self.out = out
+        self.options = options
+        self.known = None
+
+
+    def poll(self):
+        """
+        Analyzes the files that changed since the last poll, every file on the first one.
+        Returns (input file, error or None, latency in ms) triples, the latency goes
+        from the file's modification time to its XML being written, None on the first poll.
+        """
+        current = snapshot(self.paths)
+        first = self.known is None
+        changed = [input_file for input_file, stat in current.items()
+                   if first or self.known.get(input_file) != stat]
+        self.known = current
+
+        results = []
+        for input_file in changed:
+            [(_, error)] = analyzeAll([input_file], workers=1, use_cache=self.use_cache, **self.options)
+            latency = None if first else (time.time_ns() - current[input_file][0]) / 1e6
+            results.append((input_file, error, latency))
+            status = "ok" if error is None else error
+            if latency is not None:
+                status += f" ({latency:.1f} ms after change)"
+            print(f"{input_file}: {status}", file=self.out, flush=True)
+        return results
+
+
+    def run(self, interval: float = 0.25):
+        while True:
+            self.poll()
+            time.sleep(interval)
+
+
+
+def main(argv: list = None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Analyzes Jack files into XML parse trees.")
+    parser.add_argument('paths', nargs='+', help=".jack files or directories of .jack files")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"reanalyze every file, ignoring the {BuildCache.manifest_name} build caches")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and reanalyze .jack files as they change")
+    parser.add_argument('--interval', type=float, default=0.25,
+                        help="seconds between two polls in watch mode (default: 0.25)")
+    parser.add_argument('--token-cache', action='store_true',
+                        help="share tokenization across runs through <name>.jackt sidecar files")
+    parser.add_argument('--binary', action='store_true',
+                        help="write compact binary <name>.jtree parse trees instead of XML, implies --no-cache")
+    parser.add_argument('--subroutine-workers', type=int, default=0, metavar='N',
+                        help="compile the subroutines of each file in N processes, "
+                             "for huge classes, the files are then analyzed one at a time")
+    parser.add_argument('--source-map', action='store_true',
+                        help="also write a <output>.map source map per file, implies --no-cache")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="read and write the files in thread pools while parsing, for slow storage")
+    parser.add_argument('--profile', action='store_true',
+                        help="write a <name>.profile.json timing report per file, implies --no-cache")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="like --profile, and record the tracemalloc peak per phase")
+    args = parser.parse_args(argv)
+    if args.pipeline and (args.profile or args.profile_memory or args.binary or args.subroutine_workers
+                          or args.source_map or args.token_cache or args.workers is not None):
+        parser.error("--pipeline cannot be combined with --profile, --binary, --subroutine-workers, "
+                     "--source-map, --token-cache or -j")
+    if args.watch and args.pipeline:
+        parser.error("--watch cannot be combined with --pipeline")
+    workers = 1 if args.subroutine_workers > 1 else args.workers
+
+    # the build caches only track .xml outputs
+    use_cache = not (args.no_cache or args.profile or args.profile_memory or args.binary or args.source_map)
+    options = dict(profile=args.profile, profile_memory=args.profile_memory, token_cache=args.token_cache,
+                   binary=args.binary, subroutine_workers=args.subroutine_workers, source_map=args.source_map)
+
+    if args.watch:
+        try:
+            Watcher(args.paths, use_cache=use_cache, **options).run(args.interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    results = analyzeAll(collectInputs(args.paths), workers, use_cache=use_cache, pipeline=args.pipeline,
+                         **options)
+    failed = [(input_file, error) for input_file, error in results if error is not None]
+    for input_file, error in failed:
+        print(f"{input_file}: {error}", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} of {len(results)} files failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
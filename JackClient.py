@@ -0,0 +1,163 @@
+"""
+Thin client of the analyzer daemon (JackDaemon.py), analyzing paths like JackAnalyzer.py does:
+
+    python JackClient.py [--socket PATH] paths...
+
+Errors are reported the same way, with the paths as given. Unlike JackAnalyzer.py it
+reanalyzes every file, as with --no-cache: the daemon serves concurrent clients, which
+would race on the build cache manifests. The daemon's -j sets the worker processes.
+It only imports the standard library, so it starts quickly.
+Messages are JSON objects, each preceded by its length as a 4-byte big-endian integer.
+"""
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+DEFAULT_SOCKET = os.environ.get('JACK_ANALYZER_SOCKET') or \
+    os.path.join(os.environ.get('TMPDIR', '/tmp'), f'jackanalyzer-{os.getuid()}.sock')
+
+_length = struct.Struct('>I')
+
+
+def sendMessage(stream, message: dict):
+    data = json.dumps(message).encode()
+    stream.write(_length.pack(len(data)) + data)
+    stream.flush()
+
+
+def receiveMessage(stream):
+    """
+    Returns the next message, None once the other side has closed the connection.
+    """
+    header = stream.read(_length.size)
+    if len(header) < _length.size:
+        return None
+    (length,) = _length.unpack(header)
+    data = stream.read(length)
+    if len(data) < length:
+        return None
+    return json.loads(data)
+
+
+
+class JackClient:
+    """
+    A connection to the analyzer daemon. Requests:
+    {"source": text, "name": name} -> {"xml": XML, "error": None} or {"error": message}
+    {"path": file} -> the same for the file's source
+    {"path": file, "write": true} -> writes the file's .xml, {"error": None or message}
+    {"collect": paths} -> {"inputs": the .jack files under paths}
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(socket_path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.rfile = self.socket.makefile('rb')
+        self.wfile = self.socket.makefile('wb')
+
+
+    def request(self, message: dict):
+        sendMessage(self.wfile, message)
+        return self._response()
+
+
+    def requestAll(self, messages: list):
+        """
+        Sends all the messages without waiting for the responses, the daemon serves them concurrently.
+        Returns the responses in the order of the messages.
+        """
+        def send():
+            for message in messages:
+                sendMessage(self.wfile, message)
+
+        # sent from another thread, so that the responses are read while the requests go out
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        responses = [self._response() for _ in messages]
+        sender.join()
+        return responses
+
+
+    def analyze(self, source: str, name: str = None):
+        """
+        Returns the XML of a source text, raises RuntimeError with the daemon's message if it fails.
+        """
+        response = self.request({'source': source, 'name': name})
+        if response.get('error') is not None:
+            raise RuntimeError(response['error'])
+        return response['xml']
+
+
+    def _response(self):
+        response = receiveMessage(self.rfile)
+        if response is None:
+            raise ConnectionError("the analyzer daemon closed the connection")
+        return response
+
+
+    def close(self):
+        self.rfile.close()
+        self.wfile.close()
+        self.socket.close()
+
+
+
+def main(argv: list = None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Analyzes Jack files into XML parse trees through the analyzer daemon.")
+    parser.add_argument('paths', nargs='+', help=".jack files or directories of .jack files")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help=f"the daemon's socket (default: {DEFAULT_SOCKET})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="accepted for compatibility with JackAnalyzer.py, the client never uses the build caches")
+    parser.add_argument('-j', '--workers', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.workers is not None:
+        parser.error("-j is not supported, the daemon's worker processes are set by JackDaemon.py -j")
+
+    try:
+        client = JackClient(args.socket)
+    except OSError as e:
+        print(f"cannot reach the analyzer daemon on {args.socket} ({e}), start it with python JackDaemon.py",
+              file=sys.stderr)
+        return 2
+    try:
+        # the daemon may run in another directory, the files are sent as absolute paths
+        # and reported as JackAnalyzer.py names them, under the paths as given,
+        # which also replace the absolute paths in the error messages
+        collected = client.requestAll([{'collect': [os.path.abspath(path)]} for path in args.paths])
+        inputs, names, results = [], [], []
+        for path, response in zip(args.paths, collected):
+            if response.get('error') is not None:
+                # a directory that cannot be listed counts as one failed file
+                results.append((path, response['error'].replace(os.path.abspath(path), path)))
+                continue
+            for input_file in response['inputs']:
+                inputs.append(input_file)
+                names.append(path if input_file == os.path.abspath(path)
+                             else os.path.join(path, os.path.basename(input_file)))
+        responses = client.requestAll([{'path': input_file, 'write': True} for input_file in inputs])
+    finally:
+        client.close()
+
+    results += [(name, response['error'] and response['error'].replace(input_file, name))
+                for input_file, name, response in zip(inputs, names, responses)]
+    failed = [(name, error) for name, error in results if error is not None]
+    for input_file, error in failed:
+        print(f"{input_file}: {error}", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} of {len(results)} files failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Long-running analyzer daemon serving JackClient requests on a Unix domain socket.
+Interpreter startup, imports and regex compilation are paid once, the requests are
+served concurrently by a pool of worker processes.
+
+    python JackDaemon.py [--socket PATH] [-j WORKERS]
+"""
+import argparse
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from JackAnalyzer import analyzeFile, analyzeMany, collectInputs
+from JackClient import DEFAULT_SOCKET, receiveMessage, sendMessage
+
+
+def handleRequest(request: dict):
+    """
+    Serves one request, see JackClient, returns the response. Runs in a worker process.
+    """
+    try:
+        if 'collect' in request:
+            return {'inputs': collectInputs(request['collect'])}
+        if 'path' in request:
+            if request.get('write'):
+                return {'error': analyzeFile(request['path'])}
+            name = request['path']
+            with open(name, "r") as f:
+                source = f.read()
+        else:
+            name, source = request.get('name') or 'source', request['source']
+        [(_, xml)] = analyzeMany([(name, source)])
+        return {'xml': xml.decode('ascii'), 'error': None}
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+
+
+
+class _Connection(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        # the requests of a connection are served concurrently and answered in order,
+        # at most 64 of them are in flight
+        pending = queue.Queue(64)
+        sender = threading.Thread(target=self._send, args=(pending,), daemon=True)
+        sender.start()
+        try:
+            while True:
+                request = receiveMessage(self.rfile)
+                if request is None:
+                    break
+                pending.put(self.server.submit(request))
+        finally:
+            pending.put(None)
+            sender.join()
+
+
+    def _send(self, pending: queue.Queue):
+        connected = True
+        for future in iter(pending.get, None):
+            response = future.result()
+            if connected:
+                try:
+                    sendMessage(self.wfile, response)
+                except OSError:
+                    connected = False  # keeps draining, so the reading side never blocks
+
+
+
+class JackDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    One thread per connection, the analysis runs in a pool of worker processes,
+    or in the connection threads with workers=0.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, workers: int = None):
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.unlink(socket_path)  # left over by a daemon that did not shut down cleanly
+            else:
+                raise RuntimeError(f"an analyzer daemon is already listening on {socket_path}")
+            finally:
+                probe.close()
+        self.socket_path = socket_path
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        super().__init__(socket_path, _Connection)
+
+
+    def submit(self, request: dict):
+        if self.executor is not None:
+            return self.executor.submit(handleRequest, request)
+        future = Future()
+        future.set_result(handleRequest(request))
+        return future
+
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Serves Jack analysis requests on a Unix domain socket.")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help=f"the socket to listen on (default: {DEFAULT_SOCKET})")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default: one per CPU), 0 for none")
+    args = parser.parse_args(argv)
+
+    try:
+        daemon = JackDaemon(args.socket, args.workers)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"listening on {args.socket}", file=sys.stderr, flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # removes the socket too
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,66 +1,452 @@
+import mmap
+import os
 import re
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+# token kinds, the index of the token type in TokenTypes
+KEYWORD, SYMBOL, INT_CONST, STRING_CONST, IDENTIFIER, UNKNOWN = range(6)
+TokenTypes = ("keyword", "symbol", "integerConstant", "stringConstant", "identifier", None)
+
+
+class TokenTable:
+    """
+    Columnar storage of a token stream: the kind of every token in an array('B'),
+    its start and end offsets into the source buffer, and its value.
+    Values of keywords, symbols and identifiers are interned, each distinct one is stored once.
+    A table loaded from a token cache holds read-only memoryviews instead of the arrays.
+    """
+
+    def __init__(self, offset_type: str = 'I'):
+        self.kinds = array('B')
+        self.starts = array(offset_type)
+        self.ends = array(offset_type)
+        self.values = []
+
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+    def dropFront(self, count: int):
+        del self.kinds[:count]
+        del self.starts[:count]
+        del self.ends[:count]
+        del self.values[:count]
+
+
+
+def _fromLittleEndian(view: memoryview, typecode: str):
+    # a column of a token cache file as a native memoryview, on big-endian hosts
+    column = array(typecode)
+    column.frombytes(view)
+    column.byteswap()
+    return memoryview(column).cast('B')
+
 
 class JackTokenizer:
 
     KeywordsCodes = ["class", "constructor", "function", "method", "field", "static", "var", "int", "char", "boolean", "void", "true", "false", "null", "this", "let", "do", "if", "else", "while", "return"]
     SymbolsCodes = ['{', '}', '(', ')', '[', ']', '.', ',', ';', '+', '-', '*', '/', '&', '<', '>', '=', '~']
 
-    keyword_Pattern = '(?!\w)|'.join(KeywordsCodes) + '(?!\w)'
+    keyword_Pattern = r'(?!\w)|'.join(KeywordsCodes) + r'(?!\w)'
     symbol_pattern = '[' + re.escape('|'.join(SymbolsCodes)) + ']'
     int_pattern = r'\d+'
     str_pattern = r'"[^"\n]*"'
     identifier_pattern = r'[a-zA-Z_]\w*'
-    token = re.compile(keyword_Pattern + '|' + symbol_pattern + '|' + int_pattern + '|' + str_pattern + '|' + identifier_pattern)
-    
 
-    def __init__(self, input_file: str):
+    # one alternative per token type, the group name is the token type
+    # and match.lastindex - 1 is the token kind
+    token = re.compile('(?P<keyword>' + keyword_Pattern + ')|'
+                       '(?P<symbol>' + symbol_pattern + ')|'
+                       '(?P<integerConstant>' + int_pattern + ')|'
+                       '(?P<stringConstant>' + str_pattern + ')|'
+                       '(?P<identifier>' + identifier_pattern + ')')
+
+    # what no token matches: an unterminated string up to the end of its line, a run of
+    # non-ASCII characters (whole UTF-8 sequences when scanning bytes) or any other character
+    unknown_pattern = r'"[^"\n]*|[^\x00-\x7f]+|\S'
+
+    # comments are matched in the same pass as the tokens and then skipped, the unknown
+    # characters are kept as UNKNOWN tokens for the parser to report,
+    # match.lastindex - 2 is the token kind, -1 for a comment
+    comment_pattern = r'//.*|/\*[\s\S]*?\*/'
+    scanner = re.compile('(?P<comment>' + comment_pattern + ')|' + token.pattern +
+                         '|(?P<unknown>' + unknown_pattern + ')')
+    bytes_scanner = None  # for memory-mapped input, compiled on first use by _bytesScanner
+
+    # kinds of the fixed tokens, looked up before falling back to the token regex
+    FixedKinds = dict.fromkeys(KeywordsCodes, KEYWORD)
+    FixedKinds.update(dict.fromkeys(SymbolsCodes, SYMBOL))
+
+    lookahead = 64  # tokens pulled from the stream at a time in lazy mode
+
+    # token cache sidecar: the header, then the kinds, starts, ends, value indices and string lengths
+    # arrays in little-endian byte order, each padded to 8 bytes, then the utf-8 encoded strings
+    cache_suffix = '.jackt'
+    cache_header = struct.Struct('<4s32sB7xQQQ')  # magic, source sha256, offset size, tokens, strings, string bytes
+    cache_magic = b'JKT2'
+    cache_kinds = bytes(range(UNKNOWN + 1))
+
+
+    def __init__(self, input_file: str, lazy: bool = False, use_mmap: bool = False, source: str = None,
+                 token_cache: bool = False):
+        """
+        Eager mode scans the whole input up front.
+        Lazy mode scans it on demand, keeping only a small lookahead buffer of tokens.
+        use_mmap scans the memory-mapped file as bytes instead of reading it into a str,
+        token values are decoded one by one as they are emitted.
+        source: the source text, read instead of input_file
+        token_cache: load the tokens from the input file's .jackt sidecar if it was made from
+        the same source, otherwise tokenize and write the sidecar. Only used in eager, non-mmap mode.
+        """
+        self.lazy = lazy
+        data = ''
+        if source is not None:
+            data = source
+        elif input_file and use_mmap:
+            data = self._mapFile(input_file)
+        elif input_file:
+            with open(input_file, "r") as f:
+                data = f.read()
+
+        if token_cache and input_file and not (lazy or use_mmap):
+            self.currentToken = ""
+            self.data = data
+            self._lineStarts = None
+            cache_file = os.path.splitext(input_file)[0] + self.cache_suffix
+            if not self.loadTokens(cache_file):
+                self._setTable(self.findAllTokens(data))
+                try:
+                    self.saveTokens(cache_file)
+                except OSError:
+                    pass  # the cache is optional
+        else:
+            self.load(data)
+
+
+    def load(self, data):
+        """
+        Starts over on new input, a str or a bytes-like buffer.
+        """
         self.currentToken = ""
+        self.data = data
+        self._lineStarts = None
+        if self.lazy:
+            self._setTable(self._newTable())
+            self._stream = self._scan(self.data)
+        else:
+            self._setTable(self.findAllTokens(self.data)) # Find and classify all tokens
+
+
+    @property
+    def tokens(self):
+        """
+        The tokens that have not been consumed by advance() yet.
+        In lazy mode only the tokens already buffered.
+        """
+        return self._tokens[self.position:]
+
+
+    @tokens.setter
+    def tokens(self, tokens: list):
+        # the tokens are laid out as a source separated by spaces, so they get offsets too
+        self.data = ' '.join(tokens)
+        self._lineStarts = None
+        table = self._newTable()
+        start = 0
+        fixed_kinds = self.FixedKinds
+        for token in tokens:
+            kind = fixed_kinds.get(token)
+            if kind is None:
+                match = self.token.match(token)
+                kind = match.lastindex - 1 if match else UNKNOWN
+            table.kinds.append(kind)
+            table.starts.append(start)
+            table.ends.append(start + len(token))
+            table.values.append(token)
+            start += len(token) + 1
+        self._setTable(table)
+
+
+    def lineStarts(self):
+        """
+        The sorted offsets at which the lines of the source start, built on the first call.
+        """
+        if self._lineStarts is None:
+            data = self.data
+            newline = '\n' if isinstance(data, str) else b'\n'
+            self._lineStarts = array('I' if len(data) < 2 ** 32 else 'Q',
+                                     [0] + [match.end() for match in re.finditer(newline, data)])
+            # offsets into a str count characters, the byte offsets of its lines in the
+            # UTF-8 source convert them, unless it is ASCII and they are the same
+            self._lineBytes = None
+            if isinstance(data, str) and not data.isascii():
+                self._lineBytes = array('Q', accumulate((len(line.encode()) + 1 for line in data.split('\n')[:-1]),
+                                                        initial=0))
+        return self._lineStarts
+
 
-        self.data = ''
-        if input_file:
-            self.input_file = open(input_file, "r")
-            self.data = self.input_file.read()
+    def location(self, offset: int):
+        """
+        The 1-based (line, column) of a source offset, such as table.starts[i] of token i.
+        Tokens only carry offsets, lines and columns are resolved here when a diagnostic
+        or a source map needs them. Columns count the bytes of the UTF-8 source,
+        whether it was read as text or memory-mapped.
+        """
+        starts = self.lineStarts()
+        line = bisect_right(starts, offset)
+        if self._lineBytes is not None:
+            return line, len(self.data[starts[line - 1]:offset].encode()) + 1
+        return line, offset - starts[line - 1] + 1
 
-        self.data = re.sub(r'(//.*|/\*[\s\S]*?\*/)', '\n', self.data)   # remove all comments 
-        self.data = self.data.strip()
-        self.tokens = self.findAllTokens(self.data) # Find all tokens
+
+    def byteOffset(self, offset: int):
+        """
+        The offset in the UTF-8 source of a source offset, which counts characters in text input.
+        """
+        line, column = self.location(offset)
+        if self._lineBytes is None:
+            return offset
+        return self._lineBytes[line - 1] + column - 1
+
+
+    def _newTable(self):
+        return TokenTable('I' if len(self.data) < 2 ** 32 else 'Q')
+
+
+    def _setTable(self, table: TokenTable):
+        # tokens are never removed from the table, a cursor marks the next one
+        self.table = table
+        self._kinds = table.kinds
+        self._tokens = table.values
+        self.position = 0
+        self._stream = None
+
+
+    def _sourceDigest(self):
+        import hashlib
+        data = self.data
+        return hashlib.sha256(data.encode() if isinstance(data, str) else data).digest()
+
+
+    def saveTokens(self, cache_file: str):
+        """
+        Writes the whole token table to a binary token cache file.
+        """
+        table = self.table
+        strings = {}
+        indices = array('I', [strings.setdefault(value, len(strings)) for value in table.values])
+        encoded = [value.encode() for value in strings]
+        lengths = array('I', map(len, encoded))
+        blob = b''.join(encoded)
+
+        parts = [self.cache_header.pack(self.cache_magic, self._sourceDigest(), table.starts.itemsize,
+                                        len(table), len(strings), len(blob))]
+        for column in (table.kinds, table.starts, table.ends, indices, lengths, blob):
+            if isinstance(column, array) and sys.byteorder == 'big' and column.itemsize > 1:
+                column = array(column.typecode, column)
+                column.byteswap()
+            column = column if isinstance(column, bytes) else column.tobytes()
+            parts.append(column)
+            parts.append(b'\0' * (-len(column) % 8))
+
+        temporary = cache_file + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(b''.join(parts))
+        os.replace(temporary, cache_file)
+
+
+    def loadTokens(self, cache_file: str):
+        """
+        Replaces the token table by the one in a token cache file, without scanning the source.
+        The columns are memoryviews of the file's content, copies on big-endian hosts.
+        Returns False, leaving the tokenizer as it was, if the file is missing, corrupt
+        or was made from another source.
+        """
+        try:
+            with open(cache_file, 'rb') as f:
+                content = f.read()
+            magic, digest, width, count, string_count, string_bytes = self.cache_header.unpack_from(content)
+        except (OSError, struct.error):
+            return False
+        if magic != self.cache_magic or width not in (4, 8) or digest != self._sourceDigest():
+            return False
+
+        view = memoryview(content)
+        position = self.cache_header.size
+        columns = []
+        for size in (count, count * width, count * width, count * 4, string_count * 4, string_bytes):
+            columns.append(view[position:position + size])
+            position += size + (-size % 8)
+        if position != len(content):
+            return False
+        kinds, starts, ends, indices, lengths, blob = columns
+        if kinds.tobytes().translate(None, self.cache_kinds):
+            return False  # a kind no token has
+        offset_type = 'I' if width == 4 else 'Q'
+        if sys.byteorder == 'big':
+            starts, ends = _fromLittleEndian(starts, offset_type), _fromLittleEndian(ends, offset_type)
+            indices, lengths = _fromLittleEndian(indices, 'I'), _fromLittleEndian(lengths, 'I')
+
+        table = TokenTable(offset_type)
+        try:
+            strings = []
+            start = 0
+            for length in lengths.cast('I'):
+                strings.append(str(blob[start:start + length], 'utf-8'))
+                start += length
+            table.values = list(map(strings.__getitem__, indices.cast('I')))
+        except (IndexError, UnicodeDecodeError):
+            return False
+        table.kinds = kinds
+        table.starts = starts.cast(offset_type)
+        table.ends = ends.cast(offset_type)
+        self._setTable(table)
+        return True
 
 
     def tokenTypeAndValue(self, tokenValue):
-        if re.match(self.keyword_Pattern, tokenValue) is not None:
-            return ("keyword", tokenValue)
-        elif re.match(self.symbol_pattern, tokenValue) is not None:
-            return ("symbol", tokenValue)
-        elif re.match(self.int_pattern, tokenValue) is not None:
-            return ("integerConstant", tokenValue)
-        elif re.match(self.str_pattern, tokenValue) is not None:
-            return ("stringConstant", tokenValue)
-        elif re.match(self.identifier_pattern, tokenValue) is not None:
-            return ("identifier", tokenValue)
-    
-        
+        kind = self.FixedKinds.get(tokenValue)
+        if kind is not None:
+            return (TokenTypes[kind], tokenValue)
+        match = self.token.match(tokenValue)
+        if match is not None:
+            return (match.lastgroup, tokenValue)
+
+
+
+    def _mapFile(self, input_file: str):
+        with open(input_file, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return b''  # empty files cannot be mapped
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+    @classmethod
+    def _bytesScanner(cls):
+        if cls.bytes_scanner is None:
+            cls.bytes_scanner = re.compile(cls.scanner.pattern.encode('ascii'))
+        return cls.bytes_scanner
+
+
+    def _scan(self, data):
+        # yields (kind, start, end, value), values of keywords, symbols and identifiers are interned
+        strings = {}
+        if isinstance(data, str):
+            for match in self.scanner.finditer(data):
+                kind = match.lastindex - 2
+                if kind == STRING_CONST or kind == INT_CONST:
+                    yield (kind, match.start(), match.end(), match.group())
+                elif kind >= 0:
+                    value = match.group()
+                    yield (kind, match.start(), match.end(), strings.setdefault(value, value))
+        else:
+            for match in self._bytesScanner().finditer(data):
+                kind = match.lastindex - 2
+                if kind == STRING_CONST or kind == INT_CONST:
+                    yield (kind, match.start(), match.end(), match.group().decode())
+                elif kind >= 0:
+                    raw = match.group()
+                    value = strings.get(raw)
+                    if value is None:
+                        value = strings[raw] = raw.decode()
+                    yield (kind, match.start(), match.end(), value)
+
 
     def findAllTokens(self, data):
-        return self.token.findall(data)
+        """
+        Scans data (str, or a bytes-like buffer such as an mmap) once,
+        returns the classified tokens as a TokenTable.
+        """
+        table = TokenTable('I' if len(data) < 2 ** 32 else 'Q')
+        kinds, starts, ends, values = table.kinds, table.starts, table.ends, table.values
+        if not isinstance(data, str):
+            for kind, start, end, value in self._scan(data):
+                kinds.append(kind)
+                starts.append(start)
+                ends.append(end)
+                values.append(value)
+            return table
+
+        # the common case, inlined
+        strings = {}
+        intern = strings.setdefault
+        for match in self.scanner.finditer(data):
+            kind = match.lastindex - 2
+            if kind >= 0:
+                start, end = match.span()
+                value = match.group()
+                kinds.append(kind)
+                starts.append(start)
+                ends.append(end)
+                values.append(intern(value, value) if kind != STRING_CONST and kind != INT_CONST else value)
+        return table
+
+
+    def scanTokens(self, data):
+        """
+        Lazily scans data (str or bytes-like), yields (token type, token value) pairs.
+        """
+        for kind, _, _, value in self._scan(data):
+            yield (TokenTypes[kind], value)
+
+
+    def _fill(self, index: int):
+        # drops the consumed tokens, then buffers the stream up to index tokens past the cursor
+        table = self.table
+        if self.position:
+            table.dropFront(self.position)
+            self.position = 0
+        for kind, start, end, value in self._stream:
+            table.kinds.append(kind)
+            table.starts.append(start)
+            table.ends.append(end)
+            table.values.append(value)
+            if len(table) > index + self.lookahead:
+                break
+        else:
+            self._stream = None
 
 
     def hasMoreTokens(self):
-        return len(self.tokens) > 0
+        if self.position >= len(self._tokens) and self._stream is not None:
+            self._fill(0)
+        return self.position < len(self._tokens)
 
 
     def advance(self):
-        if self.hasMoreTokens(): 
-            self.currentToken = self.tokens.pop(0)
-        else:
-            self.currentToken = None
-        return self.tokenTypeAndValue(self.currentToken) if self.currentToken else None
+        if self.position >= len(self._tokens) and self._stream is not None:
+            self._fill(0)
+        position = self.position
+        if position < len(self._tokens):
+            self.currentToken = self._tokens[position]
+            self.position = position + 1
+            return (TokenTypes[self._kinds[position]], self.currentToken)
+        self.currentToken = None
+        return None
 
 
     def peek(self, index: int = 0):
-        return self.tokens[index] if len(self.tokens) > index else None
-         
-        
+        if self.position + index >= len(self._tokens) and self._stream is not None:
+            self._fill(index)
+        index += self.position
+        return self._tokens[index] if len(self._tokens) > index else None
 
 
+    def peekKind(self, index: int = 0):
+        """
+        The kind (KEYWORD, SYMBOL, ...) of the token index places after the cursor, None past the end.
+        """
+        if self.position + index >= len(self._kinds) and self._stream is not None:
+            self._fill(index)
+        index += self.position
+        return self._kinds[index] if len(self._kinds) > index else None
 
 
+    def peekType(self, index: int = 0):
+        kind = self.peekKind(index)
+        return TokenTypes[kind] if kind is not None else None
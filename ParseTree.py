@@ -0,0 +1,369 @@
+from __future__ import annotations
+import struct
+import sys
+from array import array
+from itertools import repeat
+from operator import add, sub
+
+TYPE_CHECKING = False  # typing.TYPE_CHECKING without importing typing
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ET  # imported by the functions that convert from and to it
+
+class ParseTree:
+    """
+    A compact parse tree stored as parallel arrays in pre-order (document order).
+    Node i has the tag tags[kinds[i]] and the text texts[i] (the token value of a terminal,
+    None or '\\n' for a non-terminal). Its subtree spans the nodes i .. ends[i] - 1,
+    so its children start at i + 1 and each child's end is the next child's index.
+
+    Nodes are appended while the engine builds the tree and closed the way
+    XmlStreamWriter closes its elements, see there: ends[i] is only known then.
+    """
+
+    def __init__(self):
+        self.tags = []                # tag names, indexed by kind
+        self.tag_codes = {}           # tag name -> kind
+        self.kinds = array('B')
+        self.texts = []
+        self.ends = array('I')
+        self._open = []               # indices of the nodes that can still get children
+
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+    def _kind(self, tag: str):
+        kind = self.tag_codes.get(tag)
+        if kind is None:
+            kind = self.tag_codes[tag] = len(self.tags)
+            self.tags.append(tag)
+        return kind
+
+
+    def _closeUntil(self, index: int):
+        # closes the open nodes below the node index
+        open_nodes = self._open
+        end = len(self.kinds)
+        while open_nodes[-1] != index:
+            self.ends[open_nodes.pop()] = end
+
+
+    def _appendNode(self, tag: str, text: str):
+        index = len(self.kinds)
+        self.kinds.append(self._kind(tag))
+        self.texts.append(text)
+        self.ends.append(index + 1)
+        return index
+
+
+    def root(self, tag: str):
+        """
+        Starts the tree, returns the root node.
+        """
+        self._open.append(self._appendNode(tag, None))
+        return Node(self, 0, 0)
+
+
+    def addChild(self, parent, tag: str):
+        """
+        Appends a node that can get children of its own, returns it.
+        """
+        self._closeUntil(parent.index)
+        parent.count += 1
+        index = self._appendNode(tag, None)
+        self._open.append(index)
+        return Node(self, index, 0)
+
+
+    def addTerminal(self, parent, tag: str, text: str):
+        """
+        Appends a terminal node.
+        """
+        self._closeUntil(parent.index)
+        parent.count += 1
+        self._appendNode(tag, text)
+
+
+    def graft(self, parent, tree, index: int):
+        """
+        Appends a copy of node index of the finished tree and its subtree as the last child of parent.
+        """
+        self._closeUntil(parent.index)
+        parent.count += 1
+        end = tree.ends[index]
+        codes = bytes(self._kind(tag) for tag in tree.tags)
+        self.kinds.frombytes(tree.kinds[index:end].tobytes().translate(codes.ljust(256, b'\0')))
+        self.texts.extend(tree.texts[index:end])
+        self.ends.extend(map(add, tree.ends[index:end], repeat(len(self.ends) - index)))
+
+
+    def finish(self):
+        """
+        Closes every node that is still open.
+        """
+        end = len(self.kinds)
+        while self._open:
+            self.ends[self._open.pop()] = end
+
+
+    def node(self, index: int = 0):
+        """
+        A view of node index of a finished tree.
+        """
+        return Node(self, index, None)
+
+
+    def children(self, index: int):
+        """
+        Yields the indices of the children of node index of a finished tree.
+        """
+        ends = self.ends
+        child = index + 1
+        end = ends[index]
+        while child < end:
+            yield child
+            child = ends[child]
+
+
+
+class Node:
+    """
+    A handle on one node of a ParseTree.
+    While the tree is built it supports the part of the ElementTree element
+    interface the engine uses: makeelement() followed by append(), len() and text.
+    On a finished tree it is a read-only view with tag, text, iteration over the children and iter().
+    """
+    __slots__ = ('tree', 'index', 'count')
+
+    def __init__(self, tree: ParseTree, index: int, count):
+        self.tree = tree
+        self.index = index
+        self.count = count  # children appended so far, None for views of a finished tree
+
+
+    @property
+    def tag(self):
+        return self.tree.tags[self.tree.kinds[self.index]]
+
+
+    @property
+    def text(self):
+        return self.tree.texts[self.index]
+
+
+    @text.setter
+    def text(self, value: str):
+        self.tree.texts[self.index] = value
+
+
+    def makeelement(self, tag: str, attrib: dict):
+        # unlike ElementTree the node is attached right away,
+        # the engine always appends it to this node next
+        return self.tree.addChild(self, tag)
+
+
+    def append(self, child):
+        pass  # attached by makeelement()
+
+
+    def __len__(self):
+        if self.count is not None:
+            return self.count
+        return sum(1 for _ in self.tree.children(self.index))
+
+
+    def __iter__(self):
+        tree = self.tree
+        return (Node(tree, child, None) for child in tree.children(self.index))
+
+
+    def __repr__(self):
+        return f"Node({self.tag!r}, {self.text!r})"
+
+
+    def iter(self):
+        """
+        Yields the nodes of the subtree in document order, like ET.Element.iter().
+        """
+        tree = self.tree
+        return (Node(tree, index, None) for index in range(self.index, tree.ends[self.index]))
+
+
+
+def toElement(tree: ParseTree, index: int = 0):
+    """
+    Converts the subtree of node index of a finished tree into an ElementTree element.
+    """
+    import xml.etree.ElementTree as ET
+    tags, kinds, texts = tree.tags, tree.kinds, tree.texts
+    root = ET.Element(tags[kinds[index]])
+    root.text = texts[index]
+    parents = [(tree.ends[index], root)]
+    for child in range(index + 1, tree.ends[index]):
+        while parents[-1][0] <= child:
+            parents.pop()
+        element = ET.SubElement(parents[-1][1], tags[kinds[child]])
+        element.text = texts[child]
+        parents.append((tree.ends[child], element))
+    return root
+
+
+def fromElement(element: ET.Element):
+    """
+    Converts an ElementTree element and its subtree into a finished ParseTree.
+    """
+    tree = ParseTree()
+    root = tree.root(element.tag)
+    root.text = element.text
+    stack = [(iter(element), root)]
+    while stack:
+        child = next(stack[-1][0], None)
+        if child is None:
+            stack.pop()
+            continue
+        node = tree.addChild(stack[-1][1], child.tag)
+        node.text = child.text
+        stack.append((iter(child), node))
+    tree.finish()
+    return tree
+
+
+def _escape(text: str):
+    if "&" in text or "<" in text or ">" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text
+
+
+def writeXml(tree: ParseTree, output, buffer_size: int = 4096):
+    """
+    Writes a finished tree to the binary stream output as tab-indented XML,
+    the same bytes as XmlStreamWriter (see there), but iterative,
+    so the depth of the tree is not limited by the recursion limit.
+    """
+    tags, kinds, texts, ends = tree.tags, tree.kinds, tree.texts, tree.ends
+    openings = ["<" + tag + ">" for tag in tags]
+    closings = ["</" + tag + ">" for tag in tags]
+    leaves = [{} for _ in tags]  # per tag: text -> the whole element, tokens repeat a lot
+    indents = ["\n"]            # indents[level] goes before a node of that level
+    pieces = []
+    append = pieces.append
+    stack = []                   # the open nodes that have children
+
+    for index in range(len(kinds)):
+        while stack and ends[stack[-1]] <= index:
+            node = stack.pop()
+            append(indents[len(stack)] + closings[kinds[node]])
+        level = len(stack)
+        if stack and stack[-1] + 1 != index:
+            append(indents[level])  # tail of the previous sibling
+
+        kind = kinds[index]
+        text = texts[index]
+        if ends[index] > index + 1:
+            # the text of a node with children is replaced by the indentation unless it has content
+            if level + 1 == len(indents):
+                indents.append(indents[-1] + "\t")
+            append(openings[kind] + (_escape(text) if text and text.strip() else indents[level + 1]))
+            stack.append(index)
+        else:
+            piece = leaves[kind].get(text)
+            if piece is None:
+                piece = leaves[kind][text] = openings[kind] + _escape(text or "") + closings[kind]
+            append(piece)
+
+        if len(pieces) >= buffer_size:
+            output.write("".join(pieces).encode("ascii", "xmlcharrefreplace"))
+            pieces.clear()
+
+    while stack:
+        node = stack.pop()
+        append(indents[len(stack)] + closings[kinds[node]])
+    output.write("".join(pieces).encode("ascii", "xmlcharrefreplace"))
+
+
+
+# Binary format: the header, the tag of every node as a byte, the size of its subtree, the
+# reference of its text into the string table (0 for None), the byte length of every string,
+# then the utf-8 encoded strings, the tag names first. Integers are little-endian, sizes and
+# references take 2 bytes each when they fit, else 4.
+BINARY_MAGIC = b'JPT1'
+# magic, number of tags, type codes of the sizes and references, nodes, strings, string bytes
+BINARY_HEADER = struct.Struct('<4sBccxIII')
+
+
+def _littleEndian(column: array):
+    # converts between the native and the file's byte order
+    if sys.byteorder == 'big' and column.itemsize > 1:
+        column.byteswap()
+    return column
+
+
+def writeBinary(tree: ParseTree, output):
+    """
+    Writes a finished tree to the binary stream output in the compact binary format.
+    """
+    count = len(tree)
+    references = {}
+    texts = [0 if text is None else references.setdefault(text, len(references) + 1) for text in tree.texts]
+    strings = [tag.encode() for tag in tree.tags] + [text.encode() for text in references]
+    size_code = 'H' if count < 2 ** 16 else 'I'
+    reference_code = 'H' if len(references) < 2 ** 16 else 'I'
+
+    blob = b''.join(strings)
+    output.write(BINARY_HEADER.pack(BINARY_MAGIC, len(tree.tags), size_code.encode(), reference_code.encode(),
+                                    count, len(strings), len(blob)))
+    output.write(tree.kinds.tobytes())
+    output.write(_littleEndian(array(size_code, map(sub, tree.ends, range(count)))).tobytes())
+    output.write(_littleEndian(array(reference_code, texts)).tobytes())
+    output.write(_littleEndian(array('I', map(len, strings))).tobytes())
+    output.write(blob)
+
+
+def readBinary(data):
+    """
+    Loads a tree written by writeBinary() from a bytes-like object, returns the finished ParseTree.
+    Raises ValueError if data is not in the binary format.
+    """
+    try:
+        magic, tag_count, size_code, reference_code, count, string_count, string_bytes = \
+            BINARY_HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("not a binary parse tree")
+    size_code, reference_code = size_code.decode(), reference_code.decode()
+    if magic != BINARY_MAGIC or size_code not in 'HI' or reference_code not in 'HI':
+        raise ValueError("not a binary parse tree")
+
+    view = memoryview(data)
+    position = BINARY_HEADER.size
+    columns = []
+    for typecode, length in (('B', count), (size_code, count), (reference_code, count), ('I', string_count)):
+        column = array(typecode)
+        end = position + length * column.itemsize
+        column.frombytes(view[position:end])
+        columns.append(_littleEndian(column))
+        position = end
+    kinds, sizes, references, lengths = columns
+    if position + string_bytes != len(data):
+        raise ValueError("truncated binary parse tree")
+
+    strings = []
+    for length in lengths:
+        strings.append(str(view[position:position + length], 'utf-8'))
+        position += length
+
+    tree = ParseTree()
+    tree.tags = strings[:tag_count]
+    tree.tag_codes = {tag: kind for kind, tag in enumerate(tree.tags)}
+    tree.kinds = kinds
+    texts = [None] + strings[tag_count:]
+    tree.texts = list(map(texts.__getitem__, references))
+    tree.ends = array('I', map(add, range(count), sizes))
+    return tree
+
+
+def binaryToXml(data, output):
+    """
+    Converts a tree in the binary format to the XML writeXml() gives, byte for byte.
+    """
+    writeXml(readBinary(data), output)
@@ -0,0 +1,144 @@
+import time
+import tracemalloc
+
+class Profiler:
+    """
+    Opt-in instrumentation of one CompilationEngine run.
+    Records wall time (and with memory=True the tracemalloc peak) per phase:
+    tokenize, parse and serialize, plus call counts, cumulative and exclusive
+    time per compile* method.
+    An engine created without a profiler is not instrumented at all.
+
+    callback, if given, is called with a dict for every phase as soon as it ends.
+    """
+
+    def __init__(self, callback=None, memory: bool = False):
+        self.callback = callback
+        self.memory = memory
+        self.phases = {}    # name -> {'seconds': ..., 'peak_bytes': ...}
+        self.methods = {}   # name -> [calls, cumulative seconds, exclusive seconds]
+        self.counts = {}
+        self._nested = [0.0]  # time spent in nested compile* calls, one slot per active call
+        self._active = []     # phases that have not ended yet, innermost last
+        self._started_tracing = False
+
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+
+    def phase(self, name: str):
+        """
+        Context manager timing a phase, nested phases are not counted in the outer one.
+        """
+        return _Phase(self, name)
+
+
+    def instrument(self, engine):
+        """
+        Replaces the engine's compile* methods by timed wrappers on the instance,
+        and times compileClass as the parse phase and _flush as the serialize phase.
+        """
+        for name in dir(engine):
+            if name.startswith('compile'):
+                setattr(engine, name, self._timed(name, getattr(engine, name)))
+        engine.compileClass = self._inPhase('parse', engine.compileClass)
+        engine._flush = self._inPhase('serialize', engine._flush)
+
+
+    def _timed(self, name: str, method):
+        nested = self._nested
+        entry = self.methods.setdefault(name, [0, 0.0, 0.0])
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            nested.append(0.0)
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                inner = nested.pop()
+                nested[-1] += elapsed
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] += elapsed - inner
+        return timed
+
+
+    def _inPhase(self, name: str, method):
+        def inPhase(*args, **kwargs):
+            with self.phase(name):
+                return method(*args, **kwargs)
+        return inPhase
+
+
+    def _startTracing(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+
+    def stop(self):
+        """
+        Stops tracemalloc if this profiler started it.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+
+    def report(self, input_file: str = None):
+        """
+        Returns the machine-readable report, a dict that serializes to JSON.
+        """
+        return {
+            'file': input_file,
+            'phases': self.phases,
+            'counts': self.counts,
+            'methods': {name: {'calls': calls, 'seconds': cumulative, 'self_seconds': exclusive}
+                        for name, (calls, cumulative, exclusive) in sorted(self.methods.items())},
+        }
+
+
+
+class _Phase:
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.peak = 0
+        self.inner = 0.0  # time spent in nested phases
+
+
+    def __enter__(self):
+        profiler = self.profiler
+        profiler._startTracing()
+        if tracemalloc.is_tracing():
+            if profiler._active:
+                outer = profiler._active[-1]
+                outer.peak = max(outer.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profiler._active.append(self)
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        profiler = self.profiler
+        elapsed = time.perf_counter() - self.start
+        profiler._active.pop()
+        outer = profiler._active[-1] if profiler._active else None
+
+        entry = profiler.phases.setdefault(self.name, {'seconds': 0.0, 'peak_bytes': None})
+        entry['seconds'] += elapsed - self.inner
+        if outer is not None:
+            outer.inner += elapsed
+        if tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            entry['peak_bytes'] = max(entry['peak_bytes'] or 0, self.peak)
+            if outer is not None:
+                outer.peak = max(outer.peak, self.peak)
+        if profiler.callback is not None:
+            profiler.callback(dict(entry, phase=self.name))
+        return False
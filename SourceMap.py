@@ -0,0 +1,62 @@
+"""
+Source maps: JSON sidecars mapping every node of a parse tree's output back to the source.
+
+    {"version": 1, "source": "Main.jack", "nodes": [[line, column, end line, end column], ...]}
+
+nodes holds one entry per element of the XML in document order (the node indices of the
+ParseTree), positions are 1-based, columns count the bytes of the UTF-8 source, and the
+end is exclusive. Empty elements, which span no token, map to null. The sidecar of
+Main.xml is Main.xml.map.
+"""
+import json
+from itertools import accumulate
+from JackTokenizer import TokenTypes
+
+SUFFIX = '.map'
+VERSION = 1
+
+
+def nodeSpans(tree, starts, ends):
+    """
+    Returns the (start, end) source offsets of every node of a finished tree in document order,
+    None for the nodes without terminals. Terminal i of the tree was parsed from the token
+    spanning starts[i]:ends[i], the engine consumes the tokens in document order.
+    """
+    # terminals[i] is the number of terminals before node i
+    is_terminal = bytes(tag in TokenTypes for tag in tree.tags).ljust(256, b'\0')
+    terminals = list(accumulate(tree.kinds.tobytes().translate(is_terminal), initial=0))
+    spans = []
+    for first, end in zip(terminals, tree.ends):
+        last = terminals[end] - 1
+        spans.append((starts[first], ends[last]) if last >= first else None)
+    return spans
+
+
+def writeSourceMap(tree, tokenizer, output, source: str = None):
+    """
+    Writes the source map of a finished tree parsed by tokenizer, which must still hold every token
+    (not lazy), to output, a path or a binary file object. source: the name recorded for the source.
+    """
+    location = tokenizer.location
+    nodes = [None if span is None else location(span[0]) + location(span[1])
+             for span in nodeSpans(tree, tokenizer.table.starts, tokenizer.table.ends)]
+    data = json.dumps({'version': VERSION, 'source': source, 'nodes': nodes}, separators=(',', ':')).encode()
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            f.write(data)
+    else:
+        output.write(data)
+
+
+def readSourceMap(source_map):
+    """
+    Returns the node positions of a source map, a path or a binary file object, see the module docstring.
+    """
+    if isinstance(source_map, str):
+        with open(source_map, 'rb') as f:
+            content = json.load(f)
+    else:
+        content = json.load(source_map)
+    if content.get('version') != VERSION:
+        raise ValueError(f"unsupported source map version {content.get('version')}")
+    return content['nodes']
@@ -0,0 +1,87 @@
+class StreamNode:
+    """
+    A parse tree node that only lives until its subtree has been written.
+    Supports the part of the ElementTree element interface the engine uses:
+    makeelement(), append(), len() and text.
+    """
+    __slots__ = ('writer', 'tag', 'level', 'text', 'count')
+
+    def __init__(self, writer, tag: str, level: int):
+        self.writer = writer
+        self.tag = tag
+        self.level = level
+        self.text = None
+        self.count = 0  # number of children appended so far
+
+
+    def makeelement(self, tag: str, attrib: dict):
+        return StreamNode(self.writer, tag, self.level + 1)
+
+
+    def append(self, child):
+        self.writer.openChild(self, child)
+
+
+    def __len__(self):
+        return self.count
+
+
+
+class XmlStreamWriter:
+    """
+    Writes the parse tree as tab-indented XML while the engine builds it.
+    Byte-identical to ET.indent(tree, space="\\t") followed by
+    tree.write(output, short_empty_elements=False).
+
+    Recursive descent finishes a subtree before it starts the next sibling,
+    so a node is closed as soon as a node is appended to one of its ancestors.
+    """
+
+    buffer_size = 1024  # pieces collected before they are written out
+
+    def __init__(self, output):
+        self.output = output
+        self.stack = []
+        self.pieces = []
+
+
+    def root(self, tag: str):
+        node = StreamNode(self, tag, 0)
+        self.stack.append(node)
+        self.pieces.append(f"<{tag}>")
+        return node
+
+
+    def openChild(self, parent: StreamNode, child: StreamNode):
+        stack = self.stack
+        while stack[-1] is not parent:
+            self._close(stack.pop())
+        parent.count += 1
+        stack.append(child)
+        self.pieces.append("\n" + "\t" * child.level + "<" + child.tag + ">")
+        if len(self.pieces) >= self.buffer_size:
+            self._write()
+
+
+    def _close(self, node: StreamNode):
+        if node.count:
+            self.pieces.append("\n" + "\t" * node.level + "</" + node.tag + ">")
+        else:
+            text = node.text or ""
+            if "&" in text or "<" in text or ">" in text:
+                text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            self.pieces.append(text + "</" + node.tag + ">")
+
+
+    def _write(self):
+        self.output.write("".join(self.pieces).encode("ascii", "xmlcharrefreplace"))
+        self.pieces = []
+
+
+    def finish(self):
+        """
+        Closes every node that is still open and writes out the rest.
+        """
+        while self.stack:
+            self._close(self.stack.pop())
+        self._write()
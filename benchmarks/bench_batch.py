@@ -0,0 +1,43 @@
+"""
+Batch analyzer throughput benchmark.
+
+Generates a corpus of .jack files (default 500) and times JackAnalyzer
+directory mode with 1, 2, 4 .. N worker processes.
+
+    python benchmarks/bench_batch.py [n_files]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from JackAnalyzer import analyzeAll, collectInputs
+from jackgen import generateClass
+
+
+def run(n_files=500):
+    with tempfile.TemporaryDirectory() as tmp:
+        for index in range(n_files):
+            with open(os.path.join(tmp, f"C{index:04}.jack"), "w") as f:
+                f.write(generateClass(f"C{index:04}", subroutines=10, statements=10, seed=index))
+        inputs = collectInputs([tmp])
+
+        cpus = os.cpu_count() or 1
+        counts = sorted({1, cpus} | {2 ** k for k in range(1, 8) if 2 ** k < cpus})
+        print(f"files: {n_files}, cpus: {cpus}")
+        print(f"{'workers':>8} {'wall (s)':>9} {'files/s':>9} {'speedup':>8}")
+        base = None
+        for workers in counts:
+            start = time.perf_counter()
+            results = analyzeAll(inputs, workers)
+            elapsed = time.perf_counter() - start
+            assert all(error is None for _, error in results), results
+            base = base or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {n_files / elapsed:>9.1f} {base / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
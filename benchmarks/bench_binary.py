@@ -0,0 +1,54 @@
+"""
+Binary parse tree format benchmark.
+
+Loads the sample trees of xml_files, then compares the tab-indented XML of
+writeXml with the compact binary format of writeBinary: size, write time and
+read time (ET.fromstring for XML, readBinary for the binary format).
+
+    python benchmarks/bench_binary.py [repeat]
+"""
+import io
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from ParseTree import fromElement, readBinary, writeBinary, writeXml
+
+XML_FILES = os.path.join(HERE, '..', 'xml_files')
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def serialized(write, tree):
+    output = io.BytesIO()
+    write(tree, output)
+    return output.getvalue()
+
+
+def run(repeat=200):
+    print(f"{'file':>15} {'nodes':>6} {'xml':>7} {'binary':>7} {'write xml':>10} {'write bin':>10} "
+          f"{'read xml':>9} {'read bin':>9}")
+    for name in sorted(os.listdir(XML_FILES)):
+        tree = fromElement(ET.parse(os.path.join(XML_FILES, name)).getroot())
+        xml, binary = serialized(writeXml, tree), serialized(writeBinary, tree)
+        write_xml = timed(lambda: serialized(writeXml, tree), repeat)
+        write_binary = timed(lambda: serialized(writeBinary, tree), repeat)
+        read_xml = timed(lambda: ET.fromstring(xml), repeat)
+        read_binary = timed(lambda: readBinary(binary), repeat)
+        print(f"{name:>15} {len(tree):>6} {len(xml):>7} {len(binary):>7} {write_xml * 1e3:>8.3f}ms "
+              f"{write_binary * 1e3:>8.3f}ms {read_xml * 1e3:>7.3f}ms {read_binary * 1e3:>7.3f}ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
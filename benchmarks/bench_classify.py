@@ -0,0 +1,80 @@
+"""
+Token classification micro-benchmark.
+
+Compares the old path (findall, then up to five uncompiled re.match calls
+per token on every advance() and again on every compileTerm peek) with the
+single-pass scanner that stores the token type next to the value.
+
+    python benchmarks/bench_classify.py [n_tokens]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from JackTokenizer import JackTokenizer
+
+LINE = "let x = a[i] + (y * 2) - foo(\"s\", 7);\n"
+TOKENS_PER_LINE = 21
+
+legacy_token = re.compile(JackTokenizer.keyword_Pattern + '|' + JackTokenizer.symbol_pattern + '|' +
+                          JackTokenizer.int_pattern + '|' + JackTokenizer.str_pattern + '|' +
+                          JackTokenizer.identifier_pattern)
+
+
+def legacyTokenTypeAndValue(tokenValue):
+    if re.match(JackTokenizer.keyword_Pattern, tokenValue) is not None:
+        return ("keyword", tokenValue)
+    elif re.match(JackTokenizer.symbol_pattern, tokenValue) is not None:
+        return ("symbol", tokenValue)
+    elif re.match(JackTokenizer.int_pattern, tokenValue) is not None:
+        return ("integerConstant", tokenValue)
+    elif re.match(JackTokenizer.str_pattern, tokenValue) is not None:
+        return ("stringConstant", tokenValue)
+    elif re.match(JackTokenizer.identifier_pattern, tokenValue) is not None:
+        return ("identifier", tokenValue)
+
+
+def legacy(data):
+    tokens = legacy_token.findall(data)
+    for token in tokens:
+        legacyTokenTypeAndValue(token)  # advance()
+        legacyTokenTypeAndValue(token)  # compileTerm peek
+    return len(tokens)
+
+
+def singlePass(data):
+    tokenizer = JackTokenizer('')
+    tokenizer._setTable(tokenizer.findAllTokens(data))
+    count = 0
+    while tokenizer.hasMoreTokens():
+        tokenizer.peekType()
+        tokenizer.advance()
+        count += 1
+    return count
+
+
+def best(func, data, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(n_tokens=200_000):
+    data = LINE * (n_tokens // TOKENS_PER_LINE)
+    assert legacy(data) == singlePass(data)
+    legacy_time = best(legacy, data)
+    single_time = best(singlePass, data)
+    print(f"tokens:      {n_tokens}")
+    print(f"legacy:      {legacy_time:.4f} s")
+    print(f"single-pass: {single_time:.4f} s")
+    print(f"speedup:     {legacy_time / single_time:.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,65 @@
+"""
+Analyzer daemon latency benchmark.
+
+Analyzes the same file repeatedly by spawning python JackAnalyzer.py, by
+spawning the thin client python JackClient.py, and through an open
+JackClient connection, against a daemon started for the benchmark.
+
+    python benchmarks/bench_daemon.py [runs]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+
+from JackClient import JackClient
+
+MAIN_JACK = os.path.join(ROOT, 'jack_files', 'Main.jack')
+
+
+def timed(function, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - start) / runs
+
+
+def run(runs=20):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, 'Main.jack')
+        shutil.copy(MAIN_JACK, input_file)
+        socket_path = os.path.join(tmp, 'daemon.sock')
+        daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, 'JackDaemon.py'), '--socket', socket_path,
+                                   '-j', '1'], stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+            with open(input_file) as f:
+                source = f.read()
+            client = JackClient(socket_path)
+            modes = {
+                "spawn JackAnalyzer.py": lambda: subprocess.run(
+                    [sys.executable, os.path.join(ROOT, 'JackAnalyzer.py'), '--no-cache', '-j', '1', input_file],
+                    check=True),
+                "spawn JackClient.py": lambda: subprocess.run(
+                    [sys.executable, os.path.join(ROOT, 'JackClient.py'), '--socket', socket_path, input_file],
+                    check=True),
+                "open connection": lambda: client.analyze(source, 'Main.jack'),
+            }
+            print(f"{'mode':>22} {'ms/file':>8}")
+            for name, analyze in modes.items():
+                print(f"{name:>22} {timed(analyze, runs) * 1e3:>8.2f}")
+            client.close()
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,46 @@
+"""
+Expression parsing benchmark.
+
+Times compileExpression on an expression-heavy generated class, in the default
+flat mode and in precedence mode.
+
+    python benchmarks/bench_expression.py [subroutines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from jackgen import generateClass
+
+
+def measure(input_file, **options):
+    times = []
+    for _ in range(3):
+        engine = CompilationEngine(input_file, os.devnull, **options)
+        engine._flush = lambda: None
+        start = time.perf_counter()
+        engine.compileClass()
+        times.append(time.perf_counter() - start)
+        engine.output_file.close()
+    return min(times), len(engine.tokenizer.table)
+
+
+def run(subroutines=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Expressions.jack")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Expressions", subroutines=subroutines, statements=10,
+                                  expression_depth=5, nesting=10))
+        print(f"{'mode':>11} {'parse (s)':>10} {'ns/token':>9}")
+        for name, options in (("flat", {}), ("precedence", {"precedence": True})):
+            elapsed, tokens = measure(input_file, **options)
+            print(f"{name:>11} {elapsed:>10.3f} {elapsed / tokens * 1e9:>9.0f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
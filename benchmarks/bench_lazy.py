@@ -0,0 +1,48 @@
+"""
+Eager vs lazy tokenizer benchmark.
+
+Reports time to the first token, total time to drain the stream and the
+tracemalloc peak for both modes on one large source file.
+
+    python benchmarks/bench_lazy.py [n_tokens]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from JackTokenizer import JackTokenizer
+from bench_tokenizer import writeSource
+
+
+def measure(path, lazy):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokenizer = JackTokenizer(path, lazy=lazy)
+    tokenizer.advance()
+    first = time.perf_counter() - start
+    while tokenizer.hasMoreTokens():
+        tokenizer.peek(1)
+        tokenizer.advance()
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def run(n_tokens=1_000_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Bench.jack")
+        writeSource(path, n_tokens)
+        print(f"source: {os.path.getsize(path) / 2**20:.1f} MiB")
+        print(f"{'mode':>6} {'first (s)':>10} {'total (s)':>10} {'peak (MiB)':>11}")
+        for lazy in (False, True):
+            first, total, peak = measure(path, lazy)
+            print(f"{'lazy' if lazy else 'eager':>6} {first:>10.4f} {total:>10.4f} {peak / 2**20:>11.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,68 @@
+"""
+Memory-mapped vs text input benchmark.
+
+Generates one large Jack file (default 300 MB) and drains it through
+JackTokenizer in a fresh process per mode, reporting wall time and peak RSS.
+Eager modes keep every token in memory and need several times the file size
+in RAM, so only the lazy modes run by default.
+
+    python benchmarks/bench_mmap.py [size_mb] [--eager]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+from JackTokenizer import JackTokenizer
+start = time.perf_counter()
+tokenizer = JackTokenizer({path!r}, lazy={lazy}, use_mmap={use_mmap})
+count = 0
+while tokenizer.hasMoreTokens():
+    tokenizer.peek(1)
+    tokenizer.advance()
+    count += 1
+elapsed = time.perf_counter() - start
+print(count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+LINE = "let x = a[i] + (y * 2) - foo(\"s\", 7); // comment\n"
+
+
+def writeSource(path, size_mb):
+    chunk = LINE * 20_000
+    with open(path, "w") as f:
+        for _ in range(max(1, size_mb * 2**20 // len(chunk))):
+            f.write(chunk)
+
+
+def measure(path, lazy, use_mmap):
+    code = CHILD.format(root=os.path.join(HERE, '..'), path=path, lazy=lazy, use_mmap=use_mmap)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    count, elapsed, maxrss = out.split()
+    return int(count), float(elapsed), int(maxrss) / 1024  # ru_maxrss is in KiB on Linux
+
+
+def run(size_mb=300, eager=False):
+    modes = [(True, False), (True, True)]
+    if eager:
+        modes = [(False, False), (False, True)] + modes
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Bench.jack")
+        writeSource(path, size_mb)
+        print(f"source: {os.path.getsize(path) / 2**20:.0f} MiB")
+        print(f"{'mode':>12} {'tokens':>11} {'wall (s)':>9} {'peak RSS (MiB)':>15}")
+        for lazy, use_mmap in modes:
+            count, elapsed, rss = measure(path, lazy, use_mmap)
+            name = ('lazy' if lazy else 'eager') + ('-mmap' if use_mmap else '-text')
+            print(f"{name:>12} {count:>11} {elapsed:>9.2f} {rss:>15.1f}")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--eager']
+    run(int(args[0]) if args else 300, '--eager' in sys.argv)
@@ -0,0 +1,61 @@
+"""
+Deep nesting benchmark.
+
+Parses classes whose parentheses, unary operators or if statements nest
+depth levels deep, recursively and in iterative mode. Only parsing is timed,
+the indented XML of such trees grows quadratically with the depth.
+
+    python benchmarks/bench_nesting.py [depth ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from jackgen import generateDeepExpression
+
+SHAPES = {
+    "parentheses": lambda depth: f"let y = {generateDeepExpression(depth)};",
+    "unary": lambda depth: "let y = " + "-" * depth + "x;",
+    "statements": lambda depth: "if (x) { " * depth + "let y = x;" + " }" * depth,
+}
+
+
+def writeDeep(input_file, body):
+    with open(input_file, "w") as f:
+        f.write(f"class Deep {{\n    function void f() {{\n        {body}\n        return;\n    }}\n}}\n")
+
+
+def measure(input_file, **options):
+    engine = CompilationEngine(input_file, os.devnull, **options)
+    engine._flush = lambda: None
+    start = time.perf_counter()
+    try:
+        engine.compileClass()
+    except RecursionError:
+        return None, len(engine.tokenizer.table)
+    finally:
+        engine.output_file.close()
+    return time.perf_counter() - start, len(engine.tokenizer.table)
+
+
+def run(depths=(100, 1000, 10000, 50000)):
+    print(f"{'shape':>12} {'depth':>7} {'tokens':>8} {'recursive':>10} {'iterative':>10} {'ns/token':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Deep.jack")
+        for name, body in SHAPES.items():
+            for depth in depths:
+                writeDeep(input_file, body(depth))
+                recursive, tokens = measure(input_file)
+                iterative, _ = measure(input_file, iterative=True)
+                recursive = f"{recursive:>9.3f}s" if recursive is not None else f"{'overflow':>10}"
+                print(f"{name:>12} {depth:>7} {tokens:>8} {recursive} {iterative:>9.3f}s "
+                      f"{iterative / tokens * 1e9:>9.0f}")
+
+
+if __name__ == "__main__":
+    run([int(depth) for depth in sys.argv[1:]] or (100, 1000, 10000, 50000))
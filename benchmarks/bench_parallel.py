@@ -0,0 +1,48 @@
+"""
+Intra-file parallel parsing benchmark.
+
+Compiles one generated class with thousands of subroutines sequentially and
+with its subroutines split across a process pool, output included.
+
+    python benchmarks/bench_parallel.py [subroutines] [workers ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from jackgen import generateClass
+
+
+def measure(input_file, output_file, workers):
+    engine = CompilationEngine(input_file, output_file, workers=workers)
+    start = time.perf_counter()
+    engine.compileClass()
+    engine.output_file.close()
+    return time.perf_counter() - start
+
+
+def run(subroutines=5000, workers=(2, 4)):
+    print(f"{os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Many.jack")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Many", subroutines=subroutines, statements=5))
+        outputs = {}
+        print(f"{'workers':>8} {'seconds':>8}")
+        for count in (0,) + tuple(workers):
+            outputs[count] = os.path.join(tmp, f"Many{count}.xml")
+            elapsed = measure(input_file, outputs[count], count)
+            print(f"{count or 'serial':>8} {elapsed:>8.3f}")
+        expected = open(outputs[0], "rb").read()
+        same = all(open(output, "rb").read() == expected for output in outputs.values())
+        print("identical" if same else "DIFFERENT")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[2:]] or (2, 4)
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, counts)
@@ -0,0 +1,68 @@
+"""
+Pipelined analysis benchmark.
+
+Simulates slow storage by adding a fixed latency to every file read and
+write, then analyzes generated classes one after the other (read, parse,
+write) and with analyzeAll(pipeline=True), without and with the build cache
+as the CLI uses it by default: cold, then warm (nothing to rebuild).
+
+    python benchmarks/bench_pipeline.py [classes] [latency in ms]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+import JackAnalyzer
+from BuildCache import BuildCache
+from JackAnalyzer import analyzeAll, analyzeMany
+from jackgen import generateClass
+
+
+def withLatency(function, latency):
+    def slow(*args):
+        time.sleep(latency)
+        return function(*args)
+    return slow
+
+
+def sequential(inputs):
+    for input_file in inputs:
+        source = JackAnalyzer._decodeSource(JackAnalyzer._readSource(input_file))
+        [(_, xml)] = analyzeMany([(input_file, source)])
+        JackAnalyzer._writeXml(JackAnalyzer.outputPath(input_file, '.xml'), xml)
+
+
+def run(classes=200, latency_ms=5.0):
+    JackAnalyzer._readSource = withLatency(JackAnalyzer._readSource, latency_ms / 1000)
+    JackAnalyzer._writeXml = withLatency(JackAnalyzer._writeXml, latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = []
+        for index in range(classes):
+            inputs.append(os.path.join(tmp, f"C{index}.jack"))
+            with open(inputs[-1], "w") as f:
+                f.write(generateClass(f"C{index}", subroutines=5, statements=5, seed=index))
+
+        print(f"{classes} classes, {latency_ms} ms per read and per write")
+        manifest = os.path.join(tmp, BuildCache.manifest_name)
+
+        def cold(inputs):
+            if os.path.exists(manifest):
+                os.remove(manifest)
+            return analyzeAll(inputs, pipeline=True, use_cache=True)
+
+        print(f"{'mode':>16} {'seconds':>8}")
+        modes = (("sequential", sequential), ("pipeline", lambda inputs: analyzeAll(inputs, pipeline=True)),
+                 ("pipeline, cold", cold),
+                 ("pipeline, warm", lambda inputs: analyzeAll(inputs, pipeline=True, use_cache=True)))
+        for name, analyze in modes:
+            start = time.perf_counter()
+            analyze(inputs)
+            print(f"{name:>16} {time.perf_counter() - start:>8.3f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200, float(sys.argv[2]) if len(sys.argv) > 2 else 5.0)
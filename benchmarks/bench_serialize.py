@@ -0,0 +1,62 @@
+"""
+XML serialization benchmark.
+
+Compiles a large generated class into a ParseTree, then times writeXml against
+the ElementTree route it replaced: toElement, ET.indent and ElementTree.write.
+
+    python benchmarks/bench_serialize.py [subroutines]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from ParseTree import toElement, writeXml
+from jackgen import generateClass
+
+
+def etreeXml(tree, output):
+    element_tree = ET.ElementTree(toElement(tree))
+    ET.indent(element_tree, space="\t", level=0)
+    element_tree.write(output, short_empty_elements=False)
+
+
+def timed(write, tree, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        output = io.BytesIO()
+        start = time.perf_counter()
+        write(tree, output)
+        best = min(best, time.perf_counter() - start)
+    return best, output.getvalue()
+
+
+def run(subroutines=1000):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Big.jack")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Big", subroutines=subroutines, statements=10))
+        engine = CompilationEngine(input_file, os.devnull)
+        engine._flush = lambda: None
+        engine.compileClass()
+        engine.output_file.close()
+        tree = engine.tree
+        tree.finish()
+
+    print(f"nodes: {len(tree)}")
+    print(f"{'serializer':>10} {'seconds':>8} {'ns/node':>8}")
+    results = {}
+    for name, write in (("etree", etreeXml), ("writeXml", writeXml)):
+        elapsed, results[name] = timed(write, tree)
+        print(f"{name:>10} {elapsed:>8.3f} {elapsed / len(tree) * 1e9:>8.0f}")
+    print("identical" if results["etree"] == results["writeXml"] else "DIFFERENT")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,58 @@
+"""
+Startup benchmark.
+
+Imports each entry module in a fresh interpreter under python -X importtime,
+keeps the fastest of the runs, and prints its cumulative import time with the
+modules that cost the most themselves. Exits with status 1 if a module takes
+longer than its budget, so it can guard against heavy imports creeping back
+into the start of every run.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+
+# cumulative import time budgets in milliseconds
+BUDGETS = {
+    "JackAnalyzer": 60,
+    "JackClient": 30,
+}
+
+
+def importTimes(module):
+    """
+    Returns {imported module: (self ms, cumulative ms)} for one import in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return times
+
+
+def run(runs=10, top=8):
+    over = []
+    for module, budget in BUDGETS.items():
+        best = min((importTimes(module) for _ in range(runs)), key=lambda times: times[module][1])
+        total = best[module][1]
+        print(f"{module}: {total:.1f} ms (budget {budget} ms), {len(best)} modules")
+        for name, (self_ms, _) in sorted(best.items(), key=lambda item: -item[1][0])[:top]:
+            print(f"  {self_ms:>6.2f} ms  {name}")
+        if total > budget:
+            over.append(module)
+    if over:
+        print(f"over budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,52 @@
+"""
+Statement dispatch benchmark.
+
+Times parsing of statement-dense generated classes: many short statements
+per subroutine, flat and nested, and many small subroutines.
+
+    python benchmarks/bench_statements.py [scale]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from jackgen import generateClass
+
+SHAPES = {
+    "flat": dict(subroutines=100, statements=60, statement_depth=0, expression_depth=0),
+    "nested": dict(subroutines=100, statements=20, statement_depth=4, expression_depth=0),
+    "small_subroutines": dict(subroutines=3000, statements=2, statement_depth=0, expression_depth=0),
+}
+
+
+def measure(input_file, **options):
+    times = []
+    for _ in range(5):
+        engine = CompilationEngine(input_file, os.devnull, **options)
+        engine._flush = lambda: None
+        start = time.perf_counter()
+        engine.compileClass()
+        times.append(time.perf_counter() - start)
+        engine.output_file.close()
+    return min(times), len(engine.tokenizer.table)
+
+
+def run(scale=1.0):
+    print(f"{'shape':>18} {'tokens':>8} {'parse (s)':>10} {'ns/token':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, shape in SHAPES.items():
+            shape = dict(shape, subroutines=max(1, int(shape['subroutines'] * scale)))
+            input_file = os.path.join(tmp, f"{name}.jack")
+            with open(input_file, "w") as f:
+                f.write(generateClass(name, **shape))
+            elapsed, tokens = measure(input_file)
+            print(f"{name:>18} {tokens:>8} {elapsed:>10.3f} {elapsed / tokens * 1e9:>9.0f}")
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,53 @@
+"""
+Tree vs streaming XML output benchmark.
+
+Compiles one very large generated class into the compact ParseTree, written
+out once parsed, and with the streaming writer, reporting wall time and the
+tracemalloc peak.
+
+    python benchmarks/bench_stream.py [subroutines]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from jackgen import generateClass
+
+
+def measure(input_file, output_file, stream):
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = CompilationEngine(input_file, output_file, lazy=True, stream=stream)
+    engine.compileClass()
+    engine.output_file.close()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(subroutines=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Big.jack")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Big", subroutines=subroutines, statements=10))
+        print(f"source: {os.path.getsize(input_file) / 2**20:.1f} MiB")
+        print(f"{'output':>7} {'wall (s)':>9} {'peak (MiB)':>11}")
+        outputs = []
+        for stream in (False, True):
+            output_file = os.path.join(tmp, f"Big{stream}.xml")
+            elapsed, peak = measure(input_file, output_file, stream)
+            print(f"{'stream' if stream else 'tree':>7} {elapsed:>9.2f} {peak / 2**20:>11.1f}")
+            with open(output_file, "rb") as f:
+                outputs.append(f.read())
+        assert outputs[0] == outputs[1], "outputs differ"
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,56 @@
+"""
+Token cache benchmark.
+
+Tokenizes a generated class (with comments) from scratch, with a cold .jackt
+sidecar (tokenize and save) and with a warm one (load only).
+
+    python benchmarks/bench_token_cache.py [subroutines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from JackTokenizer import JackTokenizer
+from jackgen import generateClass
+
+
+def timed(function, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(subroutines=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Cached.jack")
+        cache_file = os.path.join(tmp, "Cached.jackt")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Cached", subroutines=subroutines, statements=10, comments=1))
+
+        def cold():
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            return JackTokenizer(input_file, token_cache=True)
+
+        modes = {
+            "tokenize": lambda: JackTokenizer(input_file),
+            "cold cache": cold,
+            "warm cache": lambda: JackTokenizer(input_file, token_cache=True),
+        }
+        print(f"source {os.path.getsize(input_file) / 2**20:.1f} MiB")
+        print(f"{'mode':>11} {'seconds':>8} {'ns/token':>9}")
+        for name, make in modes.items():
+            elapsed, tokenizer = timed(make)
+            print(f"{name:>11} {elapsed:>8.3f} {elapsed / len(tokenizer.table) * 1e9:>9.0f}")
+        print(f"sidecar {os.path.getsize(cache_file) / 2**20:.1f} MiB for {len(tokenizer.table)} tokens")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,59 @@
+"""
+Tokenizer scaling benchmark.
+
+Builds Jack sources of 1k .. 1M tokens, then times JackTokenizer construction
+and draining the stream with hasMoreTokens()/peek()/advance().
+The ns/token column should stay flat as the input grows.
+
+    python benchmarks/bench_tokenizer.py [max_tokens]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from JackTokenizer import JackTokenizer
+
+# 21 tokens per line
+LINE = "let x = a[i] + (y * 2) - foo(\"s\", 7); // comment\n"
+TOKENS_PER_LINE = 21
+
+
+def writeSource(path, n_tokens):
+    with open(path, "w") as f:
+        f.write(LINE * (n_tokens // TOKENS_PER_LINE))
+
+
+def drain(tokenizer):
+    count = 0
+    while tokenizer.hasMoreTokens():
+        tokenizer.peek(1)
+        tokenizer.advance()
+        count += 1
+    return count
+
+
+def run(max_tokens=1_000_000):
+    print(f"{'tokens':>10} {'init (s)':>10} {'drain (s)':>10} {'ns/token':>10}")
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= max_tokens]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"Bench{n}.jack")
+            writeSource(path, n)
+
+            start = time.perf_counter()
+            tokenizer = JackTokenizer(path)
+            init_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            count = drain(tokenizer)
+            drain_time = time.perf_counter() - start
+
+            per_token = (init_time + drain_time) / count * 1e9
+            print(f"{count:>10} {init_time:>10.4f} {drain_time:>10.4f} {per_token:>10.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,48 @@
+"""
+Parse tree memory benchmark.
+
+Compiles a large generated class into the compact ParseTree and measures its
+size with tracemalloc, then measures the equivalent ElementTree tree.
+
+    python benchmarks/bench_tree.py [subroutines]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from ParseTree import toElement
+from jackgen import generateClass
+
+
+def run(subroutines=1000):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "Big.jack")
+        with open(input_file, "w") as f:
+            f.write(generateClass("Big", subroutines=subroutines, statements=10))
+
+        engine = CompilationEngine(input_file, os.path.join(tmp, "Big.xml"))
+        engine._flush = lambda: None  # measure the tree only
+        tokens = len(engine.tokenizer.tokens)
+
+        tracemalloc.start()
+        engine.compileClass()
+        engine.tree.finish()
+        compact, _ = tracemalloc.get_traced_memory()
+        element = toElement(engine.tree)
+        total, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        nodes = len(engine.tree)
+
+        print(f"tokens: {tokens}, nodes: {nodes}")
+        print(f"{'tree':>12} {'MiB':>7} {'bytes/node':>11}")
+        for name, size in (("ParseTree", compact), ("ElementTree", total - compact)):
+            print(f"{name:>12} {size / 2**20:>7.1f} {size / nodes:>11.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,94 @@
+"""
+Synthetic Jack source generator for the benchmarks.
+
+The generated classes only use the Jack subset the engine parses, and their
+shape is tunable: number and size of subroutines, statement nesting,
+expression nesting depth, string constant length and comment density.
+"""
+import random
+
+
+def generateExpression(rng, depth):
+    if depth <= 0:
+        return rng.choice(["x", "y", "17", "true", "a[i]", "\"s\""])
+    left = generateExpression(rng, depth - 1)
+    choice = rng.randrange(4)
+    if choice == 0:
+        return f"({left} + {generateExpression(rng, depth - 1)})"
+    if choice == 1:
+        return f"-{left}"
+    if choice == 2:
+        return f"Math.max({left}, {generateExpression(rng, depth - 1)})"
+    return f"{left} * y"
+
+
+def generateDeepExpression(depth):
+    """
+    An expression whose terms nest depth levels deep: ((x + 1) + 1) ...
+    """
+    return "(" * depth + "x" + " + 1)" * depth
+
+
+def generateComment(rng, pad):
+    if rng.randrange(2):
+        return f"{pad}// {'comment ' * rng.randrange(1, 8)}"
+    return f"{pad}/** {'block comment ' * rng.randrange(1, 8)}\n{pad} * more text\n{pad} */"
+
+
+def generateStatements(rng, count, depth, indent, shape):
+    pad = "    " * indent
+    lines = []
+    for _ in range(count):
+        choice = rng.randrange(6) if depth > 0 else rng.randrange(4)
+        if choice == 0:
+            lines.append(f"{pad}let x = {generateExpression(rng, shape['expression_depth'])};")
+        elif choice == 1:
+            lines.append(f"{pad}let a[i] = {generateExpression(rng, 1)};")
+        elif choice == 2:
+            lines.append(f"{pad}do Output.printInt({generateExpression(rng, 1)});")
+        elif choice == 3:
+            if shape['string_length']:
+                text = ''.join(rng.choice("abcdefgh ") for _ in range(shape['string_length']))
+                lines.append(f"{pad}do Output.printString(\"{text}\");")
+            else:
+                lines.append(f"{pad}let y = {generateDeepExpression(shape['nesting'])};")
+        elif choice == 4:
+            lines.append(f"{pad}if ({generateExpression(rng, 1)}) {{")
+            lines.extend(generateStatements(rng, 2, depth - 1, indent + 1, shape))
+            lines.append(f"{pad}}} else {{")
+            lines.extend(generateStatements(rng, 1, depth - 1, indent + 1, shape))
+            lines.append(f"{pad}}}")
+        else:
+            lines.append(f"{pad}while (x < 10) {{")
+            lines.extend(generateStatements(rng, 2, depth - 1, indent + 1, shape))
+            lines.append(f"{pad}}}")
+        for _ in range(shape['comments']):
+            lines.append(generateComment(rng, pad))
+    return lines
+
+
+def generateClass(name="Main", subroutines=10, statements=10, seed=0, expression_depth=2,
+                  statement_depth=2, nesting=1, string_length=0, comments=0):
+    """
+    Returns the source of a Jack class.
+    subroutines: number of subroutines
+    statements: top-level statements per subroutine
+    expression_depth: depth of the random expressions in let statements
+    statement_depth: how deep if and while statements nest
+    nesting: parenthesis depth of the deep expressions
+    string_length: length of string constants, 0 for none
+    comments: comments after every statement
+    """
+    rng = random.Random(seed)
+    shape = {'expression_depth': expression_depth, 'nesting': nesting,
+             'string_length': string_length, 'comments': comments}
+    lines = [f"class {name} {{", "    field int x, y;", "    static Array a;", ""]
+    for index in range(subroutines):
+        lines.append(f"    function int f{index}(int i, boolean b) {{")
+        lines.append("        var int x, y;")
+        lines.extend(generateStatements(rng, statements, statement_depth, 2, shape))
+        lines.append("        return x;")
+        lines.append("    }")
+        lines.append("")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
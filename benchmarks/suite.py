@@ -0,0 +1,111 @@
+"""
+Benchmark suite over synthetic corpora of different shapes.
+
+For every shape it generates one class and times, separately:
+  - JackTokenizer construction
+  - every CompilationEngine.compile* method (calls and exclusive time, through Profiler)
+  - XML serialization of the finished parse tree
+Results are written as JSON, and can be compared against an earlier run.
+
+    python benchmarks/suite.py [--scale 1.0] [--repeat 3] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from CompilationEngine import CompilationEngine
+from JackAnalyzer import VERSION
+from Profiler import Profiler
+from jackgen import generateClass
+
+SHAPES = {
+    "balanced": dict(subroutines=200, statements=10),
+    "many_subroutines": dict(subroutines=2000, statements=2),
+    "deep_expressions": dict(subroutines=100, statements=10, expression_depth=6, nesting=40),
+    "long_strings": dict(subroutines=100, statements=10, string_length=2000),
+    "heavy_comments": dict(subroutines=200, statements=10, comments=3),
+}
+
+
+def runShape(input_file):
+    profiler = Profiler()
+    engine = CompilationEngine(input_file, os.devnull, profiler=profiler)
+    output = io.BytesIO()
+    engine.output_file.close()
+    engine.output_file = output
+    engine.compileClass()
+
+    report = profiler.report()
+    result = {phase: report['phases'][phase]['seconds'] for phase in ('tokenize', 'parse', 'serialize')}
+    result['tokens'] = report['counts']['tokens']
+    result['compile'] = {name: {'calls': method['calls'], 'seconds': method['self_seconds']}
+                         for name, method in report['methods'].items()}
+    result['xml_bytes'] = len(output.getvalue())
+    return result
+
+
+def best(results):
+    # keeps the fastest of the repeated runs
+    return min(results, key=lambda result: result['tokenize'] + result['parse'] + result['serialize'])
+
+
+def run(scale=1.0, repeat=3, shapes=None):
+    report = {'version': VERSION, 'python': platform.python_version(),
+              'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'scale': scale, 'shapes': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, shape in SHAPES.items():
+            if shapes and name not in shapes:
+                continue
+            shape = dict(shape, subroutines=max(1, int(shape['subroutines'] * scale)))
+            input_file = os.path.join(tmp, f"{name}.jack")
+            with open(input_file, "w") as f:
+                f.write(generateClass(name, **shape))
+            result = best([runShape(input_file) for _ in range(repeat)])
+            result['source_bytes'] = os.path.getsize(input_file)
+            report['shapes'][name] = result
+    return report
+
+
+def printReport(report, baseline=None):
+    print(f"{'shape':>18} {'tokens':>8} {'tokenize':>9} {'parse':>9} {'serialize':>10}")
+    for name, result in report['shapes'].items():
+        line = f"{name:>18} {result['tokens']:>8}"
+        for phase in ('tokenize', 'parse', 'serialize'):
+            line += f" {result[phase]:>8.3f}s"
+            old = (baseline or {}).get('shapes', {}).get(name)
+            if old:
+                line += f" ({result[phase] / old[phase]:.2f}x)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplies the number of subroutines")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per shape, the fastest is kept")
+    parser.add_argument('--shape', action='append', choices=sorted(SHAPES), help="only run these shapes")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.scale, args.repeat, args.shape)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    printReport(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
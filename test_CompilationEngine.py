@@ -1,14 +1,23 @@
+import io
+import os
+import tempfile
 import unittest
 from JackTokenizer import JackTokenizer
-from CompilationEngine import CompilationEngine
-import xml.etree.cElementTree as ET
+from CompilationEngine import CompilationEngine, JackSyntaxError
+from ParseTree import ParseTree, binaryToXml, fromElement, readBinary, toElement, writeBinary, writeXml
+from Profiler import Profiler
+from SourceMap import readSourceMap
+import xml.etree.ElementTree as ET
+
+MAIN_JACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jack_files', 'Main.jack')
+XML_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xml_files')
  
 
 
 class TestJackTokenizer(unittest.TestCase):
     
     def setUp(self) -> None:
-        self.compilationEngine = CompilationEngine('', "temp.xml")
+        self.compilationEngine = CompilationEngine('', io.BytesIO())
     
     def getXmlFmtStr(self, node):
         ET.indent(node)
@@ -44,7 +53,11 @@ Received:
             <test>
                 <return>
                     <keyword>return</keyword>
-                    <identifier>x</identifier>
+                    <expression>
+                        <term>
+                            <identifier>x</identifier>
+                        </term>
+                    </expression>
                     <symbol>;</symbol>
                 </return>
             </test>
@@ -55,8 +68,8 @@ Received:
 
 
     def test_compileDo_empty(self):
-        compilationEngine = CompilationEngine('', "temp.xml")
-        compilationEngine.tokenizer.tokens = ["do", "someFunc", "(", ")"]
+        compilationEngine = CompilationEngine('', io.BytesIO())
+        compilationEngine.tokenizer.tokens = ["do", "someFunc", "(", ")", ";"]
         root = ET.Element("test") 
         compilationEngine.compileDo(root)
         expected = """
@@ -67,6 +80,7 @@ Received:
                 <symbol>(</symbol>
                 <expressionList>\n</expressionList>
                 <symbol>)</symbol>
+                <symbol>;</symbol>
                 </doStatement>
             </test>
         """
@@ -76,7 +90,7 @@ Received:
 
 
     def test_compileDo_one_param(self):
-        self.compilationEngine.tokenizer.tokens = ["do", "someFunc", "(", "x", ")"]
+        self.compilationEngine.tokenizer.tokens = ["do", "someFunc", "(", "x", ")", ";"]
         root = ET.Element("test") 
         self.compilationEngine.compileDo(root)
         expected = """
@@ -93,6 +107,7 @@ Received:
             </expression>            
                 </expressionList>
                 <symbol>)</symbol>
+                <symbol>;</symbol>
             </doStatement>
         </test>
         """
@@ -103,7 +118,7 @@ Received:
 
     def test_compileDo_multi_param(self):
         self.compilationEngine.tokenizer.tokens = ["do", "someFunc", "(", "x", ",", "y",
-                                                    ",", "3", ")", '{', '}']
+                                                    ",", "3", ")", ";"]
         root = ET.Element("test") 
         self.compilationEngine.compileDo(root)
         expected = """
@@ -132,6 +147,7 @@ Received:
                 </expression>
                 </expressionList>
                 <symbol>)</symbol>
+                <symbol>;</symbol>
             </doStatement>
         </test>
         """
@@ -559,4 +575,324 @@ Received:
 
         self.assertXml(root, expected)
 
-    
+
+
+    def compileFile(self, input_file, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, 'out.xml')
+            engine = CompilationEngine(input_file, output_file, **options)
+            engine.compileClass()
+            engine.output_file.close()
+            with open(output_file, 'rb') as f:
+                return f.read()
+
+
+    def test_stream_matches_tree(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            special = os.path.join(tmp, 'Special.jack')
+            with open(special, 'w') as f:
+                f.write('class Special { function void f() { let s = "a<b & c>d"; return; } }')
+            for input_file in [MAIN_JACK, special]:
+                self.assertEqual(self.compileFile(input_file, stream=True), self.compileFile(input_file))
+
+
+    def test_compact_tree_matches_etree(self):
+        tokens = ['if', '(', 'x', '>', '4', ')', '{', 'let', 'a', '[', 'i', ']', '=', '-', 'foo', '(', ')', ';', '}',
+                  'else', '{', 'do', 'Bar', '.', 'baz', '(', '1', ',', '"s"', ')', ';', '}']
+        element_root = ET.Element("test")
+        self.compilationEngine.tokenizer.tokens = tokens
+        self.compilationEngine.compileIf(element_root)
+
+        tree = ParseTree()
+        self.compilationEngine.tokenizer.tokens = tokens
+        self.compilationEngine.compileIf(tree.root("test"))
+        tree.finish()
+
+        self.assertEqual(ET.tostring(toElement(tree)), ET.tostring(element_root))
+        self.assertEqual([(node.tag, node.text) for node in tree.node().iter()],
+                         [(node.tag, node.text) for node in element_root.iter()])
+        if_node = next(iter(tree.node()))
+        self.assertEqual(len(if_node), len(element_root[0]))
+        self.assertEqual([node.tag for node in if_node], [node.tag for node in element_root[0]])
+
+
+    def test_profiler_records_phases_and_methods(self):
+        events = []
+        profiler = Profiler(callback=events.append, memory=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = CompilationEngine(MAIN_JACK, os.path.join(tmp, 'out.xml'), profiler=profiler)
+            engine.compileClass()
+            engine.output_file.close()
+        profiler.stop()
+
+        report = profiler.report(MAIN_JACK)
+        self.assertEqual([event['phase'] for event in events], ['tokenize', 'serialize', 'parse'])
+        self.assertEqual(report['counts']['tokens'], len(engine.tokenizer.table))
+        self.assertEqual(report['methods']['compileClass']['calls'], 1)
+        self.assertEqual(report['methods']['compileSubroutine']['calls'], 2)
+        self.assertGreater(report['phases']['parse']['peak_bytes'], 0)
+        for method in report['methods'].values():
+            self.assertLessEqual(method['self_seconds'], method['seconds'])
+
+
+    def test_compileExpression_precedence(self):
+        # x + 2 * 7 - (y)
+        engine = CompilationEngine('', io.BytesIO(), precedence=True)
+        engine.tokenizer.tokens = ['x', '+', '2', '*', '7', '-', '(', 'y', ')']
+        root = ET.Element("test")
+        engine.compileExpression(root)
+        expected = """
+        <test>
+            <expression>
+                <expression>
+                    <term>
+                        <identifier>x</identifier>
+                    </term>
+                    <symbol>+</symbol>
+                    <expression>
+                        <term>
+                            <integerConstant>2</integerConstant>
+                        </term>
+                        <symbol>*</symbol>
+                        <term>
+                            <integerConstant>7</integerConstant>
+                        </term>
+                    </expression>
+                </expression>
+                <symbol>-</symbol>
+                <term>
+                    <symbol>(</symbol>
+                    <expression>
+                        <term>
+                            <identifier>y</identifier>
+                        </term>
+                    </expression>
+                    <symbol>)</symbol>
+                </term>
+            </expression>
+        </test>
+        """
+
+        self.assertXml(root, expected)
+
+
+    def test_precedence_nesting(self):
+        def nesting(element):
+            # the expression nodes as parentheses, the terms as their tokens
+            if element.tag == 'expression':
+                return '(' + ' '.join(map(nesting, element)) + ')'
+            return element.text if len(element) == 0 else ''.join(map(nesting, element))
+
+        cases = {'a * b + c - d': '(((a * b) + c) - d)',
+                 'a - b * c / d | e': '((a - ((b * c) / d)) | e)',
+                 'f(a + b * c, d) = x[i * j - k] & -(p + q * r)':
+                     '((f((a + (b * c)),(d)) = x[((i * j) - k)]) & -((p + (q * r))))',
+                 'a': '(a)'}
+        for iterative in [False, True]:
+            engine = CompilationEngine('', io.BytesIO(), precedence=True, iterative=iterative)
+            for source, expected in cases.items():
+                engine.tokenizer.tokens = source.replace('(', ' ( ').replace(')', ' ) ').replace(',', ' , ') \
+                    .replace('[', ' [ ').replace(']', ' ] ').split()
+                root = ET.Element("test")
+                engine.compileExpression(root)
+                self.assertEqual(nesting(root[0]), expected)
+
+
+    def test_precedence_stream_matches_tree(self):
+        self.assertEqual(self.compileFile(MAIN_JACK, precedence=True, stream=True),
+                         self.compileFile(MAIN_JACK, precedence=True))
+
+
+    def test_iterative_matches_recursive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            nested = os.path.join(tmp, 'Nested.jack')
+            with open(nested, 'w') as f:
+                f.write('class Nested { function void f() { var int x; '
+                        'while (~(x < 3)) { if (a[-(x + 1)]) { let a[Math.f(x, (2 * x))] = -~x; } '
+                        'else { do g(); } } return; } }')
+            for input_file in [MAIN_JACK, nested]:
+                for options in [{}, {'stream': True}, {'precedence': True}]:
+                    self.assertEqual(self.compileFile(input_file, iterative=True, **options),
+                                     self.compileFile(input_file, **options))
+
+
+    def test_iterative_deep_nesting(self):
+        # parses only, the indented XML of deep trees grows quadratically with the depth
+        depth = 5000
+        with tempfile.TemporaryDirectory() as tmp:
+            deep = os.path.join(tmp, 'Deep.jack')
+            with open(deep, 'w') as f:
+                f.write('class Deep { function void f() { ' + 'if (x) { ' * depth +
+                        'let x = ' + '-(' * depth + 'x' + ')' * depth + ';' + ' }' * depth + ' return; } }')
+            for iterative in [False, True]:
+                engine = CompilationEngine(deep, os.path.join(tmp, 'Deep.xml'), iterative=iterative)
+                engine._flush = lambda: None
+                if iterative:
+                    engine.compileClass()
+                else:
+                    self.assertRaises(RecursionError, engine.compileClass)
+                engine.output_file.close()
+        engine.tree.finish()
+        tags = [node.tag for node in engine.tree.node().iter()]
+        self.assertEqual(tags.count('ifStatement'), depth)
+        self.assertEqual(tags.count('expression'), depth * 2 + 1)
+
+
+    def test_binary_output_converts_to_xml(self):
+        binary = self.compileFile(MAIN_JACK, binary=True)
+        xml = io.BytesIO()
+        binaryToXml(binary, xml)
+        self.assertEqual(xml.getvalue(), self.compileFile(MAIN_JACK))
+        self.assertRaises(ValueError, readBinary, binary[:-1])
+        self.assertRaises(ValueError, CompilationEngine, MAIN_JACK, io.BytesIO(), binary=True, stream=True)
+
+        for name in sorted(os.listdir(XML_FILES)):
+            tree = fromElement(ET.parse(os.path.join(XML_FILES, name)).getroot())
+            expected, output, converted = io.BytesIO(), io.BytesIO(), io.BytesIO()
+            writeXml(tree, expected)
+            writeBinary(tree, output)
+            binaryToXml(output.getvalue(), converted)
+            self.assertEqual(converted.getvalue(), expected.getvalue())
+            self.assertLess(len(output.getvalue()), len(expected.getvalue()) / 3)
+
+
+    def test_writeXml_matches_etree(self):
+        def etreeXml(tree):
+            element_tree = ET.ElementTree(toElement(tree))
+            ET.indent(element_tree, space="\t", level=0)
+            output = io.BytesIO()
+            element_tree.write(output, short_empty_elements=False)
+            return output.getvalue()
+
+        special = ET.fromstring('<class><a>x &amp; &lt;y&gt; é</a><b>content<c> </c><d/></b>'
+                                '<e>\n<f><g>\n</g></f></e><h/></class>')
+        trees = [fromElement(special)]
+        trees += [fromElement(ET.parse(os.path.join(XML_FILES, name)).getroot())
+                  for name in sorted(os.listdir(XML_FILES))]
+        for tree in trees:
+            output = io.BytesIO()
+            writeXml(tree, output, buffer_size=7)
+            self.assertEqual(output.getvalue(), etreeXml(tree))
+
+
+    def test_parallel_subroutines_match_sequential(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            many = os.path.join(tmp, 'Many.jack')
+            with open(many, 'w') as f:
+                f.write('class Many {\n    field int x;\n')
+                for index in range(9):
+                    f.write(f'    method void m{index}(int a) {{ var int b; // {{ in a comment\n'
+                            f'        if (a) {{ let b = "}}"; }} else {{ do m{index}(a - 1); }} return; }}\n')
+                f.write('}\n')
+            broken = os.path.join(tmp, 'Broken.jack')
+            with open(broken, 'w') as f:
+                f.write('class Broken { function void f() { return; } function void g() { let x = ; } '
+                        'function void h() { return; } }')
+
+            for options in [{}, {'stream': True}, {'precedence': True}]:
+                for input_file in [MAIN_JACK, many]:
+                    self.assertEqual(self.compileFile(input_file, workers=2, **options),
+                                     self.compileFile(input_file, **options))
+                with self.assertRaises(JackSyntaxError) as parallel:
+                    self.compileFile(broken, workers=2, **options)
+                with self.assertRaises(JackSyntaxError) as sequential:
+                    self.compileFile(broken, **options)
+                self.assertEqual(str(parallel.exception), str(sequential.exception))
+            self.assertRaises(ValueError, CompilationEngine, many, io.BytesIO(), lazy=True, workers=2)
+
+
+    def test_syntax_errors_recovered(self):
+        source = ('class Broken {\n'
+                  '    field int x\n'
+                  '    function void f() {\n'
+                  '        let a = ;\n'
+                  '        let b = 1;\n'
+                  '        foo;\n'
+                  '        if (a { let c = 2; }\n'
+                  '        return;\n'
+                  '    }\n'
+                  '    function void g() {\n'
+                  '        var int y\n'
+                  '        do h(1 2);\n'
+                  '        return;\n'
+                  '    }\n'
+                  '}\n')
+        expected = [(3, 5, "expected ';', found 'function'"),
+                    (4, 17, "expected a term, found ';'"),
+                    (6, 9, "expected a statement, found 'foo'"),
+                    (7, 15, "expected ')', found '{'"),
+                    (12, 9, "expected ';', found 'do'"),
+                    (12, 16, "expected ')', found '2'")]
+        for options in [{}, {'iterative': True}, {'precedence': True}, {'lazy': True}, {'stream': True}]:
+            engine = CompilationEngine(None, io.BytesIO(), source=source, **options)
+            with self.assertRaises(JackSyntaxError) as context:
+                engine.compileClass()
+            self.assertEqual([(d.line, d.column, d.message) for d in context.exception.diagnostics], expected)
+            self.assertEqual(context.exception.diagnostics, engine.diagnostics)
+
+        # the error is in the last statement of a nested block, recovering finishes that block
+        source = ('class Nested {\n  function void f() {\n    while (x) { let y = ; }\n'
+                  '    if (y) { while (x) { let x = 1; let y = ; } }\n'
+                  '    return;\n  }\n  function void g() { return; }\n}\n')
+        for options in [{}, {'iterative': True}]:
+            engine = CompilationEngine(None, io.BytesIO(), source=source, **options)
+            with self.assertRaises(JackSyntaxError) as context:
+                engine.compileClass()
+            self.assertEqual(str(context.exception), "2 syntax errors\n  3:25: expected a term, found ';'"
+                                                     "\n  4:45: expected a term, found ';'")
+
+        # characters no token matches are reported where they are
+        source = ('class Lexical {\n  field int a#b;\n  function void f() {\n    let x = 1 @;\n'
+                  '    do Output.printString("abc);\n    return;\n  }\n}\n')
+        for options in [{}, {'iterative': True}, {'lazy': True}, {'stream': True}]:
+            engine = CompilationEngine(None, io.BytesIO(), source=source, **options)
+            with self.assertRaises(JackSyntaxError) as context:
+                engine.compileClass()
+            self.assertEqual(str(context.exception), "3 syntax errors\n  2:14: unexpected character '#'"
+                                                     "\n  4:15: unexpected character '@'"
+                                                     "\n  5:27: unterminated string")
+
+        engine = CompilationEngine(None, io.BytesIO(), source='class Truncated {\n    function void f() {')
+        with self.assertRaises(JackSyntaxError) as context:
+            engine.compileClass()
+        self.assertEqual(str(context.exception), "1 syntax error\n  2:24: expected '}', found end of file")
+
+
+    def test_malformed_declarations_and_statements(self):
+        cases = [('function int f() { return 1 2 3; }', "1:39: expected ';', found '2'"),
+                 ('field int 3 + ;', "1:21: expected an identifier, found '3'"),
+                 ('function void f(int int , , x) { return; }', "1:31: expected an identifier, found 'int'"),
+                 ('function void f() { var 1 2; return; }', "1:35: expected a type, found '1'"),
+                 ('function void f() { do 1 + 2(); return; }', "1:34: expected an identifier, found '1'"),
+                 ('function void f() { do g() return; }', "1:38: expected ';', found 'return'"),
+                 ('function void f() { let 5 = 3; return; }', "1:35: expected an identifier, found '5'"),
+                 ('function 5 f() { return; }', "1:20: expected a type, found '5'"),
+                 ('} class B {', "1:13: expected end of file, found 'class'")]
+        for members, error in cases:
+            for options in [{}, {'iterative': True}]:
+                engine = CompilationEngine(None, io.BytesIO(), source='class A { ' + members + ' }', **options)
+                with self.assertRaises(JackSyntaxError) as context:
+                    engine.compileClass()
+                self.assertEqual(str(context.exception), "1 syntax error\n  " + error)
+
+
+    def test_source_map(self):
+        with open(MAIN_JACK) as f:
+            lines = f.read().split('\n')
+        for options in [{}, {'precedence': True}, {'iterative': True}, {'use_mmap': True}]:
+            output, source_map = io.BytesIO(), io.BytesIO()
+            CompilationEngine(MAIN_JACK, output, source_map=source_map, **options).compileClass()
+            source_map.seek(0)
+            nodes = readSourceMap(source_map)
+            elements = list(ET.fromstring(output.getvalue()).iter())
+            self.assertEqual(len(nodes), len(elements))
+            self.assertEqual(nodes[0][:2], [8, 1])  # class, after the comments
+            for element, node in zip(elements, nodes):
+                if element.tag in ('keyword', 'symbol', 'integerConstant', 'stringConstant', 'identifier'):
+                    line, column, end_line, end_column = node
+                    self.assertEqual(line, end_line)
+                    self.assertEqual(lines[line - 1][column - 1:end_column - 1], element.text.strip())
+                elif len(element) == 0:
+                    self.assertIsNone(node)
+        self.assertRaises(ValueError, CompilationEngine, MAIN_JACK, io.BytesIO(), stream=True,
+                          source_map=io.BytesIO())
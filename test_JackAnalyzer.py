@@ -0,0 +1,259 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import io
+import json
+import zipfile
+import unittest
+from BuildCache import BuildCache
+import JackAnalyzer
+from JackAnalyzer import VERSION, Watcher, analyzeAll, analyzeMany, collectInputs, main
+
+MAIN_JACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jack_files', 'Main.jack')
+BROKEN_ERROR = "JackSyntaxError: 1 syntax error\n  1:15: expected '}', found end of file"
+
+
+class TestJackAnalyzer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        for name in ['B.jack', 'A.jack']:
+            shutil.copy(MAIN_JACK, os.path.join(self.tmp, name))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def writeBroken(self):
+        path = os.path.join(self.tmp, 'Broken.jack')
+        with open(path, 'w') as f:
+            f.write('class Broken {')
+        return path
+
+
+    def test_collectInputs_directory(self):
+        with open(os.path.join(self.tmp, 'notes.txt'), 'w') as f:
+            f.write('')
+        inputs = collectInputs([self.tmp])
+        self.assertEqual([os.path.basename(path) for path in inputs], ['A.jack', 'B.jack'])
+
+
+    def test_analyzeAll_writes_outputs_in_order(self):
+        inputs = collectInputs([self.tmp])
+        results = analyzeAll(inputs, workers=2)
+        self.assertEqual(results, [(path, None) for path in inputs])
+        with open(os.path.join(self.tmp, 'A.xml')) as a, open(os.path.join(self.tmp, 'B.xml')) as b:
+            self.assertEqual(a.read(), b.read())
+
+
+    def test_analyzeAll_reports_errors(self):
+        broken = self.writeBroken()
+        results = dict(analyzeAll(collectInputs([self.tmp]), workers=1))
+        self.assertEqual(results[broken], BROKEN_ERROR)
+        self.assertEqual(results[os.path.join(self.tmp, 'A.jack')], None)
+
+
+    def test_syntax_error_keeps_previous_output(self):
+        broken = os.path.join(self.tmp, 'A.jack')
+        analyzeAll([broken], workers=1)
+        with open(os.path.join(self.tmp, 'A.xml')) as f:
+            previous = f.read()
+        with open(broken, 'w') as f:
+            f.write('class Broken {')
+        for options in ({}, {'binary': True}):
+            self.assertEqual(JackAnalyzer.analyzeFile(broken, **options), BROKEN_ERROR)
+        with open(os.path.join(self.tmp, 'A.xml')) as f:
+            self.assertEqual(f.read(), previous)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['A.jack', 'A.xml', 'B.jack'])
+
+
+    def test_cache_skips_unchanged_files(self):
+        inputs = collectInputs([self.tmp])
+        analyzeAll(inputs, workers=1, use_cache=True)
+        a_xml = os.path.join(self.tmp, 'A.xml')
+        with open(a_xml, 'w') as f:
+            f.write('marker')
+
+        analyzeAll(inputs, workers=1, use_cache=True)
+        with open(a_xml) as f:
+            self.assertEqual(f.read(), 'marker')
+
+        with open(inputs[0], 'a') as f:
+            f.write('// changed')
+        analyzeAll(inputs, workers=1, use_cache=True)
+        with open(a_xml) as f:
+            self.assertNotEqual(f.read(), 'marker')
+
+
+    def test_cache_reanalyzes_older_versions(self):
+        a_jack = os.path.join(self.tmp, 'A.jack')
+        old = BuildCache(self.tmp, "1.1")
+        old.record(a_jack, BuildCache.digest(a_jack))
+        old.save()
+        a_xml = os.path.join(self.tmp, 'A.xml')
+        with open(a_xml, 'w') as f:
+            f.write('marker')
+        analyzeAll([a_jack], workers=1, use_cache=True)
+        with open(a_xml) as f:
+            self.assertNotEqual(f.read(), 'marker')
+        self.assertEqual(BuildCache(self.tmp, VERSION).entries['A.jack']['version'], VERSION)
+
+
+    def test_cache_evicts_deleted_files(self):
+        analyzeAll(collectInputs([self.tmp]), workers=1, use_cache=True)
+        os.remove(os.path.join(self.tmp, 'B.jack'))
+        analyzeAll(collectInputs([self.tmp]), workers=1, use_cache=True)
+        with open(os.path.join(self.tmp, BuildCache.manifest_name)) as f:
+            self.assertEqual(list(json.load(f)['files']), ['A.jack'])
+
+
+    def test_cache_retries_failed_files(self):
+        broken = self.writeBroken()
+        analyzeAll([broken], workers=1, use_cache=True)
+        results = analyzeAll([broken], workers=1, use_cache=True)
+        self.assertEqual(results, [(broken, BROKEN_ERROR)])
+
+
+    def test_watcher_reanalyzes_changed_files(self):
+        watcher = Watcher([self.tmp], use_cache=False, out=io.StringIO())
+        first = watcher.poll()
+        self.assertEqual([(os.path.basename(f), e, l) for f, e, l in first],
+                         [('A.jack', None, None), ('B.jack', None, None)])
+        self.assertEqual(watcher.poll(), [])
+
+        a_jack = os.path.join(self.tmp, 'A.jack')
+        with open(a_jack, 'a') as f:
+            f.write('// changed')
+        broken = self.writeBroken()
+        changed = watcher.poll()
+        self.assertEqual([(f, e) for f, e, _ in changed],
+                         [(a_jack, None), (broken, BROKEN_ERROR)])
+        self.assertTrue(all(latency >= 0 for _, _, latency in changed))
+
+
+    def test_watcher_passes_options(self):
+        watcher = Watcher([self.tmp], use_cache=False, out=io.StringIO(), binary=True, source_map=True)
+        self.assertEqual([error for _, error, _ in watcher.poll()], [None, None])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'A.jtree.map')))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'A.xml')))
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            main([self.tmp, '--watch', '--pipeline'])
+
+
+    def test_main_exit_code(self):
+        self.assertEqual(main([self.tmp, '-j', '1']), 0)
+        self.writeBroken()
+        self.assertEqual(main([self.tmp, '-j', '1']), 1)
+
+
+    def test_main_source_map(self):
+        a_xml = os.path.join(self.tmp, 'A.xml')
+        self.assertEqual(main([self.tmp, '-j', '1']), 0)
+        with open(a_xml, 'rb') as f:
+            streamed = f.read()
+        self.assertFalse(os.path.exists(a_xml + '.map'))
+        self.assertEqual(main([self.tmp, '-j', '1', '--source-map']), 0)
+        with open(a_xml, 'rb') as f:
+            self.assertEqual(f.read(), streamed)
+        with open(a_xml + '.map') as f:
+            self.assertEqual(json.load(f)['source'], 'A.jack')
+
+
+    def test_non_jack_inputs_are_not_overwritten(self):
+        notes = os.path.join(self.tmp, 'notes.txt')
+        with open(notes, 'w') as f:
+            f.write('keep me')
+        a_jack = os.path.join(self.tmp, 'A.jack')
+        error = f"ValueError: not a .jack file: {notes}"
+        for pipeline in (False, True):
+            self.assertEqual(analyzeAll([notes, a_jack], workers=1, pipeline=pipeline),
+                             [(notes, error), (a_jack, None)])
+        self.assertEqual(main([notes, a_jack, '--no-cache', '-j', '1']), 1)
+        with open(notes) as f:
+            self.assertEqual(f.read(), 'keep me')
+
+
+    def test_analyzeMany_reports_errors_per_source(self):
+        with open(MAIN_JACK) as f:
+            source = f.read()
+        failed = []
+        results = list(analyzeMany([('Broken.jack', 'class Broken {'), ('Main.jack', source),
+                                    ('Bad.jack', 'class Bad { function void f() { foo; return; } }'),
+                                    ('Again.jack', source)],
+                                   errors=lambda name, error: failed.append((name, str(error)))))
+        [(_, expected)] = analyzeMany([('Main.jack', source)])
+        self.assertEqual(results, [('Main.jack', expected), ('Again.jack', expected)])
+        self.assertEqual([name for name, _ in failed], ['Broken.jack', 'Bad.jack'])
+        self.assertIn("expected a statement, found 'foo'", failed[1][1])
+        with self.assertRaises(Exception):
+            list(analyzeMany([('Broken.jack', 'class Broken {'), ('Main.jack', source)]))
+
+
+    def test_analyzeMany_matches_files(self):
+        inputs = collectInputs([self.tmp])
+        analyzeAll(inputs, workers=1)
+        with open(MAIN_JACK) as f:
+            source = f.read()
+        with open(inputs[0].replace('.jack', '.xml'), 'rb') as f:
+            expected = f.read()
+        other = 'class Other { function void f() { return; } }'
+
+        archive = io.BytesIO()
+        results = list(analyzeMany([('Main.jack', source), ('Other', other), ('Again.jack', source)],
+                                   archive=archive))
+        self.assertEqual([name for name, _ in results], ['Main.jack', 'Other', 'Again.jack'])
+        self.assertEqual(results[0][1], expected)
+        self.assertEqual(results[2][1], expected)
+        self.assertTrue(results[1][1].startswith(b'<class>'))
+        with zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(bundle.namelist(), ['Main.xml', 'Other.xml', 'Again.xml'])
+            self.assertEqual(bundle.read('Other.xml'), results[1][1])
+        self.assertEqual([xml for _, xml in analyzeMany([('Main', source)], stream=False)], [expected])
+        archive = io.BytesIO()
+        [(_, binary)] = analyzeMany([('Main.jack', source)], archive=archive, binary=True)
+        with zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(bundle.namelist(), ['Main.jtree'])
+            self.assertEqual(bundle.read('Main.jtree'), binary)
+
+
+    def test_pipeline_matches_process_pool(self):
+        broken = self.writeBroken()
+        missing = os.path.join(self.tmp, 'Missing.jack')
+        inputs = collectInputs([self.tmp]) + [missing]
+        expected = analyzeAll(inputs, workers=1)
+        with open(os.path.join(self.tmp, 'A.xml'), 'rb') as f:
+            xml = f.read()
+        os.remove(os.path.join(self.tmp, 'A.xml'))
+
+        results = analyzeAll(inputs, pipeline=True)
+        self.assertEqual([input_file for input_file, _ in results], inputs)
+        self.assertEqual(dict(results)[broken], BROKEN_ERROR)
+        self.assertEqual([error is None for _, error in results], [error is None for _, error in expected])
+        with open(os.path.join(self.tmp, 'A.xml'), 'rb') as f:
+            self.assertEqual(f.read(), xml)
+
+
+    def test_pipeline_reads_each_file_once_with_cache(self):
+        broken = self.writeBroken()
+        inputs = collectInputs([self.tmp])
+        reads = []
+        read = JackAnalyzer._readSource
+        JackAnalyzer._readSource = lambda input_file: reads.append(input_file) or read(input_file)
+        try:
+            results = analyzeAll(inputs, use_cache=True, pipeline=True)
+            self.assertEqual(sorted(reads), sorted(inputs))
+            self.assertEqual(dict(results)[broken], BROKEN_ERROR)
+            with open(os.path.join(self.tmp, 'B.jack'), 'a') as f:
+                f.write('\n')
+            del reads[:]
+            os.remove(os.path.join(self.tmp, 'B.xml'))
+            results = analyzeAll(inputs, use_cache=True, pipeline=True)
+        finally:
+            JackAnalyzer._readSource = read
+        self.assertEqual(sorted(reads), sorted(inputs))
+        self.assertEqual(dict(results)[broken], BROKEN_ERROR)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'B.xml')))
+        self.assertEqual(set(BuildCache(self.tmp, VERSION).entries), {'A.jack', 'B.jack'})
+        for flags in (['-j', '2'], ['--token-cache']):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                main([self.tmp, '--pipeline'] + flags)
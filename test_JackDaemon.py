@@ -0,0 +1,98 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from JackAnalyzer import analyzeMany, main as analyzer_main
+from JackClient import JackClient, main
+import JackDaemon as daemon_module
+from JackDaemon import JackDaemon
+
+MAIN_JACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jack_files', 'Main.jack')
+
+
+class TestJackDaemon(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp, 'daemon.sock')
+        shutil.copy(MAIN_JACK, os.path.join(self.tmp, 'Main.jack'))
+        with open(MAIN_JACK) as f:
+            self.source = f.read()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def startDaemon(self, workers):
+        daemon = JackDaemon(self.socket_path, workers)
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            daemon.shutdown()
+            daemon.server_close()
+            thread.join()
+        self.addCleanup(stop)
+        return daemon
+
+
+    def test_requests(self):
+        for workers in [0, 1]:
+            daemon = self.startDaemon(workers)
+            [(_, expected)] = analyzeMany([('Main.jack', self.source)])
+            client = JackClient(self.socket_path)
+            self.assertEqual(client.analyze(self.source, 'Main.jack'), expected.decode())
+            self.assertEqual(client.request({'path': os.path.join(self.tmp, 'Main.jack')})['xml'],
+                             expected.decode())
+            self.assertRaises(RuntimeError, client.analyze, 'class Broken {')
+            responses = client.requestAll([{'source': self.source}] * 20)
+            self.assertEqual([response['xml'] for response in responses], [expected.decode()] * 20)
+            client.close()
+            daemon.shutdown()
+            daemon.server_close()
+            self.assertFalse(os.path.exists(self.socket_path))
+
+
+    def test_client_main(self):
+        self.assertEqual(main([self.tmp, '--socket', self.socket_path]), 2)
+        self.startDaemon(0)
+        self.assertEqual(main([self.tmp, '--socket', self.socket_path]), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'Main.xml')))
+        with open(os.path.join(self.tmp, 'Broken.jack'), 'w') as f:
+            f.write('class Broken {')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(main([self.tmp, '--socket', self.socket_path, '--no-cache']), 1)
+        expected = io.StringIO()
+        with contextlib.redirect_stderr(expected):
+            self.assertEqual(analyzer_main([self.tmp, '--no-cache', '-j', '1']), 1)
+        self.assertEqual(stderr.getvalue(), expected.getvalue())
+
+        relative = os.path.relpath(os.path.join(self.tmp, 'Broken.jack'))
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(main([relative, '--socket', self.socket_path]), 1)
+        self.assertTrue(stderr.getvalue().startswith(f"{relative}: JackSyntaxError"))
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            main([self.tmp, '--socket', self.socket_path, '-j', '2'])
+
+        # errors name the files as the command line does, not by their absolute paths
+        missing = os.path.relpath(os.path.join(self.tmp, 'Missing.jack'))
+        stderr, expected = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(main([missing, '--socket', self.socket_path]), 1)
+        with contextlib.redirect_stderr(expected):
+            self.assertEqual(analyzer_main([missing, '--no-cache', '-j', '1']), 1)
+        self.assertEqual(stderr.getvalue(), expected.getvalue())
+
+        # a path the daemon cannot collect fails on its own
+        def collectInputs(paths):
+            raise PermissionError(f"[Errno 13] Permission denied: '{paths[0]}'")
+        stderr = io.StringIO()
+        with mock.patch.object(daemon_module, 'collectInputs', collectInputs), contextlib.redirect_stderr(stderr):
+            self.assertEqual(main([missing, '--socket', self.socket_path]), 1)
+        self.assertEqual(stderr.getvalue(), f"{missing}: PermissionError: [Errno 13] Permission denied: '{missing}'\n"
+                                            "1 of 1 files failed\n")
@@ -1,5 +1,13 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
 import unittest
-from JackTokenizer import JackTokenizer
+from unittest import mock
+from JackTokenizer import JackTokenizer, KEYWORD, SYMBOL, INT_CONST, STRING_CONST, IDENTIFIER, UNKNOWN
+
+MAIN_JACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jack_files', 'Main.jack')
 
 
 class TestJackTokenizer(unittest.TestCase):
@@ -75,3 +83,147 @@ class TestJackTokenizer(unittest.TestCase):
     def test_peek_empty(self):
         self.jackTokenizer.tokens = []
         self.assertEqual(self.jackTokenizer.peek(), None)
+
+    def test_peek_after_advance(self):
+        self.jackTokenizer.tokens = ['class', 'Main', '{']
+        self.jackTokenizer.advance()
+        self.assertEqual(self.jackTokenizer.peek(), 'Main')
+        self.assertEqual(self.jackTokenizer.peek(1), '{')
+        self.assertEqual(self.jackTokenizer.peek(2), None)
+        self.assertEqual(self.jackTokenizer.tokens, ['Main', '{'])
+
+    def test_findAllTokens_classifies(self):
+        table = self.jackTokenizer.findAllTokens('let x = "hi" + 12;')
+        self.assertEqual(table.values, ['let', 'x', '=', '"hi"', '+', '12', ';'])
+        self.assertEqual(list(table.kinds), [KEYWORD, IDENTIFIER, SYMBOL, STRING_CONST,
+                                             SYMBOL, INT_CONST, SYMBOL])
+        self.assertEqual(list(table.starts), [0, 4, 6, 8, 13, 15, 17])
+        self.assertEqual(list(table.ends), [3, 5, 7, 12, 14, 17, 18])
+
+    def test_peekType(self):
+        self.jackTokenizer.tokens = ['do', 'foo']
+        self.assertEqual(self.jackTokenizer.peekType(), 'keyword')
+        self.assertEqual(self.jackTokenizer.peekType(1), 'identifier')
+        self.assertEqual(self.jackTokenizer.peekType(2), None)
+
+    def test_findAllTokens_skips_comments(self):
+        table = self.jackTokenizer.findAllTokens('x /* a\n b */ y // z\n"//not a comment"')
+        self.assertEqual(table.values, ['x', 'y', '"//not a comment"'])
+
+    def test_findAllTokens_keeps_unknown_characters(self):
+        source = 'x @ "é" é\ny = "abc);\nz'
+        table = self.jackTokenizer.findAllTokens(source)
+        self.assertEqual(table.values, ['x', '@', '"é"', 'é', 'y', '=', '"abc);', 'z'])
+        self.assertEqual(list(table.kinds), [IDENTIFIER, UNKNOWN, STRING_CONST, UNKNOWN,
+                                             IDENTIFIER, SYMBOL, UNKNOWN, IDENTIFIER])
+        self.assertEqual(list(self.jackTokenizer.scanTokens(source.encode())),
+                         list(self.jackTokenizer.scanTokens(source)))
+
+    def drain(self, tokenizer):
+        tokens = []
+        while tokenizer.hasMoreTokens():
+            tokens.append((tokenizer.peek(1), tokenizer.advance()))
+        return tokens
+
+    def test_lazy_matches_eager(self):
+        eager = JackTokenizer(MAIN_JACK)
+        lazy = JackTokenizer(MAIN_JACK, lazy=True)
+        self.assertEqual(self.drain(lazy), self.drain(eager))
+        self.assertEqual(lazy.advance(), None)
+
+    def test_lazy_peek_past_buffer(self):
+        lazy = JackTokenizer(MAIN_JACK, lazy=True)
+        eager = JackTokenizer(MAIN_JACK)
+        far = lazy.lookahead * 2
+        self.assertEqual(lazy.peek(far), eager.peek(far))
+        self.assertEqual(lazy.advance(), ('keyword', 'class'))
+
+    def test_mmap_matches_text(self):
+        for lazy in (False, True):
+            mapped = JackTokenizer(MAIN_JACK, lazy=lazy, use_mmap=True)
+            self.assertEqual(self.drain(mapped), self.drain(JackTokenizer(MAIN_JACK)))
+
+    def test_values_are_interned(self):
+        table = self.jackTokenizer.findAllTokens('foo.bar(foo, "s", "s")')
+        self.assertIs(table.values[0], table.values[4])
+        self.assertIs(table.values[5], table.values[7])
+
+    def test_tokens_setter_offsets(self):
+        self.jackTokenizer.tokens = ['do', 'foo', '(', ')']
+        self.assertEqual(self.jackTokenizer.peekKind(1), IDENTIFIER)
+        self.assertEqual(list(self.jackTokenizer.table.starts), [0, 3, 7, 9])
+
+    def test_token_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_file = os.path.join(tmp, 'Main.jack')
+            shutil.copy(MAIN_JACK, input_file)
+            written = JackTokenizer(input_file, token_cache=True)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'Main.jackt')))
+
+            loaded = JackTokenizer(None, source=written.data)
+            self.assertTrue(loaded.loadTokens(os.path.join(tmp, 'Main.jackt')))
+            self.assertIsInstance(loaded.table.kinds, memoryview)
+            for column in ('kinds', 'starts', 'ends', 'values'):
+                self.assertEqual(list(getattr(loaded.table, column)), list(getattr(written.table, column)))
+            self.assertEqual(self.drain(JackTokenizer(input_file, token_cache=True)), self.drain(written))
+
+            # a changed source invalidates the cache
+            with open(input_file, 'a') as f:
+                f.write('\n// changed\nclass')
+            self.assertFalse(JackTokenizer(None, source='class').loadTokens(os.path.join(tmp, 'Main.jackt')))
+            self.assertEqual(JackTokenizer(input_file, token_cache=True).table.values[-1], 'class')
+            self.assertIsInstance(JackTokenizer(input_file, token_cache=True).table.kinds, memoryview)
+
+    def test_token_cache_byte_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_file = os.path.join(tmp, 'Main.jackt')
+            written = JackTokenizer(MAIN_JACK)
+            written.saveTokens(cache_file)
+            with open(cache_file, 'rb') as f:
+                content = f.read()
+            count = len(written.table)
+            position = JackTokenizer.cache_header.size + count + (-count % 8)
+            self.assertEqual(list(struct.unpack_from(f'<{count}I', content, position)), list(written.table.starts))
+
+            # a big-endian host reads the same file
+            with mock.patch.object(sys, 'byteorder', 'big'):
+                swapped = os.path.join(tmp, 'Swapped.jackt')
+                written.saveTokens(swapped)
+                loaded = JackTokenizer(None, source=written.data)
+                self.assertTrue(loaded.loadTokens(swapped))
+            for column in ('kinds', 'starts', 'ends', 'values'):
+                self.assertEqual(list(getattr(loaded.table, column)), list(getattr(written.table, column)))
+
+            # kinds no token has are rejected
+            with open(cache_file, 'wb') as f:
+                f.write(content[:JackTokenizer.cache_header.size] + b'\x09' +
+                        content[JackTokenizer.cache_header.size + 1:])
+            self.assertFalse(JackTokenizer(None, source=written.data).loadTokens(cache_file))
+
+    def test_location(self):
+        source = 'class Main {\n\n  // a comment\n  field int x;\n}'
+        for tokenizer in [JackTokenizer(None, source=source), JackTokenizer(MAIN_JACK, use_mmap=True)]:
+            data = tokenizer.data
+            newline = '\n' if isinstance(data, str) else b'\n'
+            self.assertEqual(tokenizer.lineStarts()[0], 0)
+            for start in tokenizer.table.starts:
+                self.assertEqual(tokenizer.location(start),
+                                 (data[:start].count(newline) + 1, start - data[:start].rfind(newline)))
+        tokenizer = JackTokenizer(None, source=source)
+        self.assertEqual([tokenizer.location(start) for start in tokenizer.table.starts],
+                         [(1, 1), (1, 7), (1, 12), (4, 3), (4, 9), (4, 13), (4, 14), (5, 1)])
+        tokenizer.load('let\nx')
+        self.assertEqual(tokenizer.location(4), (2, 1))
+
+    def test_location_counts_bytes(self):
+        source = 'class A {\n  field String s; let s = "h\u00e9llo"; let t\n}'
+        with tempfile.TemporaryDirectory() as tmp:
+            input_file = os.path.join(tmp, 'A.jack')
+            with open(input_file, 'w', encoding='utf-8') as f:
+                f.write(source)
+            text, mapped = JackTokenizer(input_file), JackTokenizer(input_file, use_mmap=True)
+            self.assertEqual(text.table.values, mapped.table.values)
+            for text_start, mapped_start in zip(text.table.starts, mapped.table.starts):
+                self.assertEqual(text.location(text_start), mapped.location(mapped_start))
+                self.assertEqual(text.byteOffset(text_start), mapped_start)
+            self.assertEqual(text.location(text.table.starts[-2]), (2, 41))